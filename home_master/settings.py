@@ -115,6 +115,25 @@ DATABASES = {
 }
 
 
+# Cache
+# Файловый кэш общий для всех воркеров gunicorn на сервере (версия каталога и т.п.)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    }
+}
+
+# Как часто (в секундах) воркер записывает накопленные счетчики популярности в базу
+POPULARITY_FLUSH_INTERVAL = int(os.getenv('POPULARITY_FLUSH_INTERVAL', 60))
+# Сколько разных объектов может накопиться в буфере между записями
+POPULARITY_BUFFER_MAX_KEYS = int(os.getenv('POPULARITY_BUFFER_MAX_KEYS', 10000))
+
+# Отправка уведомлений из очереди (manage.py send_notifications)
+NOTIFICATION_TRANSPORT = os.getenv('NOTIFICATION_TRANSPORT', 'main.notifications.TelegramTransport')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -3,7 +3,8 @@ from django import forms
 from django.utils.html import format_html
 from unfold.admin import ModelAdmin
 from unfold.contrib.filters.admin import RangeDateFilter
-from .models import Category, Product, Service, Order, JobApplication, Employee, Specialization, OrderImage
+from .models import Category, Product, Service, Order, JobApplication, Employee, Specialization, OrderImage, Notification
+from .bulk_status import set_order_status, set_application_status
 
 @admin.register(Category)
 class CategoryAdmin(ModelAdmin):
@@ -54,12 +55,7 @@ class CategoryAdmin(ModelAdmin):
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
         if 'specializations' in form.cleaned_data:
-            # Обновляем связи
-            for spec in Specialization.objects.all():
-                if spec in form.cleaned_data['specializations']:
-                    spec.categories.add(obj)
-                else:
-                    spec.categories.remove(obj)
+            obj.set_specializations(form.cleaned_data['specializations'])
 
 @admin.register(Product)
 class ProductAdmin(ModelAdmin):
@@ -182,6 +178,13 @@ class OrderAdmin(ModelAdmin):
     list_editable = ['status']
     search_fields = ['name', 'phone']
     readonly_fields = ['date_created']
+    actions = ['mark_spam']
+
+    @admin.action(description='Отметить как спам')
+    def mark_spam(self, request, queryset):
+        # Один UPDATE вместо сохранения каждого заказа; счетчики мастеров обновляются там же
+        changed = set_order_status(queryset.values_list('pk', flat=True), 'spam')
+        self.message_user(request, f'Отмечено как спам: {changed}')
     
     fieldsets = (
         ('Основная информация', {
@@ -209,6 +212,12 @@ class JobApplicationAdmin(ModelAdmin):
     list_editable = ['status']
     search_fields = ['first_name', 'last_name', 'phone', 'city', 'specialization']
     readonly_fields = ['date_created']
+    actions = ['mark_spam']
+
+    @admin.action(description='Отметить как спам')
+    def mark_spam(self, request, queryset):
+        changed = set_application_status(queryset.values_list('pk', flat=True), 'spam')
+        self.message_user(request, f'Отмечено как спам: {changed}')
     
     def get_full_name(self, obj):
         return f"{obj.first_name} {obj.last_name}"
@@ -247,4 +256,11 @@ class OrderImageAdmin(ModelAdmin):
             'fields': ('uploaded_at',),
             'classes': ('collapse',)
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(Notification)
+class NotificationAdmin(ModelAdmin):
+    list_display = ['__str__', 'chat_id', 'status', 'attempts', 'next_attempt_at', 'date_created', 'date_sent']
+    list_filter = ['status', ('date_created', RangeDateFilter)]
+    search_fields = ['text', 'last_error']
+    readonly_fields = ['date_created', 'date_sent', 'last_error']
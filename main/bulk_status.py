@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import record_master_changes
+from .models import JobApplication, Order
+from . import rollups, workload
+
+
+def set_order_status(order_ids, status):
+    """Задает статус выбранным заказам одним UPDATE вместо save() на каждый. Возвращает число измененных.
+
+    save() и сигналы не вызываются, поэтому дата выполнения, счетчики загрузки
+    мастеров и сводка заказов по дням обновляются здесь же. Статус не входит
+    в поисковый документ заказа, так что индекс поиска не меняется.
+    """
+    with transaction.atomic():
+        rows = list(
+            Order.objects.filter(pk__in=order_ids).exclude(status=status)
+            .values_list("pk", "status", "date_completed", "date_created")
+        )
+        orders = [(pk, old_status, completed) for pk, old_status, completed, _ in rows]
+        if not orders:
+            return 0
+        now = timezone.now()
+        # Как в Order.save: дата выполнения ставится при первом переводе в "выполнен" и сбрасывается при выходе из него
+        date_completed = Coalesce(F("date_completed"), Value(now)) if status == "completed" else None
+        Order.objects.filter(pk__in=[pk for pk, _, _ in orders]).update(status=status, date_completed=date_completed)
+
+        rollups.orders_moved([(created, old_status) for _, old_status, _, created in rows], status)
+        employee_ids = workload.orders_status_changed(orders, status, now)
+        if employee_ids:
+            transaction.on_commit(lambda: record_master_changes(employee_ids))
+    return len(orders)
+
+
+def set_application_status(application_ids, status):
+    """Задает статус выбранным анкетам одним UPDATE. Возвращает число измененных"""
+    return JobApplication.objects.filter(pk__in=application_ids).exclude(status=status).update(status=status)
+
+
+BULK_STATUS_SETTERS = {Order: set_order_status, JobApplication: set_application_status}
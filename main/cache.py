@@ -0,0 +1,168 @@
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Category, MasterChange, Product, Service, Specialization
+
+
+CATALOG_VERSION_KEY = 'main:catalog_version'
+
+# Кэш текущего процесса: список доступных категорий и версия каталога, для которой он собран
+_local = {'version': None, 'categories': None}
+_graph = {'snapshot': (None, None)}  # (версия, JSON) снимка связей каталога
+_lock = threading.Lock()
+
+
+def get_catalog_version():
+    """Возвращает общую для всех процессов версию каталога"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Увеличивает версию каталога, делая недействительными кэши всех процессов"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def get_available_categories():
+    """Возвращает список доступных категорий из кэша процесса"""
+    version = get_catalog_version()
+    if _local['version'] != version:
+        with _lock:
+            if _local['version'] != version:
+                _local['categories'] = list(Category.objects.filter(available=True))
+                _local['version'] = version
+    return _local['categories']
+
+
+# Полностраничный кэш публичных страниц для анонимных посетителей
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+CSRF_TOKEN_PLACEHOLDER = '__csrf_token_placeholder__'
+
+
+def _section_version_key(section):
+    return f'main:section_version:{section}'
+
+
+def get_section_version(section):
+    """Возвращает версию раздела сайта (главная, страницы одной категории)"""
+    if section is None:
+        return 0
+    return cache.get(_section_version_key(section), 0)
+
+
+def bump_section_versions(*sections):
+    """Сбрасывает кэш страниц указанных разделов"""
+    for section in set(filter(None, sections)):
+        key = _section_version_key(section)
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+# Связи специализация -> категория -> товар -> услуга для зависимых списков в формах заказа и сотрудника
+CATALOG_GRAPH_SECTION = 'catalog:graph'  # двоеточия в slug категории не бывает
+
+
+def get_catalog_graph_version():
+    """Меняется вместе с версией каталога и при любом изменении товаров, услуг и специализаций"""
+    return f'{get_catalog_version()}.{get_section_version(CATALOG_GRAPH_SECTION)}'
+
+
+CATALOG_GRAPH_TIMEOUT = 60 * 60 * 24
+
+
+def build_catalog_graph():
+    """Снимок всех связей каталога: по одному запросу на уровень, ссылки - по id.
+
+    Товары и услуги - только доступные, как и в формах.
+    """
+    specialization_categories = defaultdict(list)
+    for specialization_id, category_id in Specialization.categories.through.objects.values_list('specialization_id', 'category_id'):
+        specialization_categories[specialization_id].append(category_id)
+    return {
+        'specializations': [
+            [pk, name, specialization_categories[pk]]
+            for pk, name in Specialization.objects.values_list('id', 'name')
+        ],
+        'categories': list(Category.objects.values_list('id', 'name')),
+        'products': list(Product.objects.filter(available=True).values_list('id', 'name', 'category_id')),
+        'services': list(Service.objects.filter(available=True).values_list('id', 'name', 'product_id')),
+    }
+
+
+def get_catalog_graph():
+    """Возвращает (версия, JSON) снимка связей каталога; собирается один раз на версию для всех процессов"""
+    version = get_catalog_graph_version()
+    if _graph['snapshot'][0] != version:
+        with _lock:
+            if _graph['snapshot'][0] != version:
+                key = f'main:catalog_graph:{version}'
+                payload = cache.get(key)
+                if payload is None:
+                    payload = json.dumps(
+                        {'version': version, **build_catalog_graph()}, ensure_ascii=False, separators=(',', ':')
+                    )
+                    cache.set(key, payload, CATALOG_GRAPH_TIMEOUT)
+                _graph['snapshot'] = (version, payload)
+    return _graph['snapshot']
+
+
+def get_page_cache_key(path, section=None):
+    """Ключ страницы: путь + версия каталога + версия раздела"""
+    return f'main:page:{get_catalog_version()}:{section}:{get_section_version(section)}:{path}'
+
+
+# Лента изменений мастеров для индекса рекомендаций (main/recommendations.py).
+# Хранится в таблице MasterChange, а не в кэше: FileBasedCache увеличивает счетчик
+# не атомарно, и два процесса могли получить одну версию и затереть изменения друг друга
+
+MASTERS_CHANGE_TIMEOUT = 60 * 60  # сколько хранить записи ленты
+MASTERS_CHANGE_PRUNE_EVERY = 100  # удалять старые записи на каждой сотой
+MAX_MASTER_CHANGES = 1000  # больше изменений за раз - проще перечитать всех
+FULL_RELOAD = '*'
+
+
+def get_masters_version():
+    return MasterChange.objects.aggregate(version=Max('pk'))['version'] or 0
+
+
+def record_master_changes(employee_ids):
+    """Отмечает сотрудников, чьи данные для подбора изменились (None - все сразу)"""
+    ids = [FULL_RELOAD] if employee_ids is None else sorted(set(employee_ids))
+    if not ids:
+        return
+    change = MasterChange.objects.create(employee_ids=ids)
+    if change.pk % MASTERS_CHANGE_PRUNE_EVERY == 0:
+        MasterChange.objects.filter(date_created__lt=timezone.now() - timedelta(seconds=MASTERS_CHANGE_TIMEOUT)).delete()
+
+
+def get_master_changes(since, until):
+    """Сотрудники, измененные между версиями; None, если ленту не восстановить и нужна полная перезагрузка"""
+    if until < since or until - since > MAX_MASTER_CHANGES:
+        return None
+    changes = list(MasterChange.objects.filter(pk__gt=since, pk__lte=until).values_list('employee_ids', flat=True))
+    # Пропуск в номерах - запись удалена как устаревшая или откатилась вместе с транзакцией
+    if len(changes) != until - since:
+        return None
+    ids = set()
+    for change in changes:
+        if FULL_RELOAD in change:
+            return None
+        ids.update(change)
+    return ids
@@ -0,0 +1,235 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+from .models import Category, Product, Service, allocate_slugs, create_slug, slug_has_base
+from .search import index_objects
+
+
+# Строка файла - один объект каталога. parent - slug категории для товара и slug товара для услуги
+COLUMNS = ["type", "slug", "name", "parent", "price", "available", "popularity", "description"]
+TYPES = {"category": Category, "product": Product, "service": Service}
+PARENTS = {Product: ("category", Category), Service: ("product", Product)}
+FORMATS = ("csv", "jsonl")
+
+TRUE_VALUES = {"1", "true", "yes", "да", "+"}
+FALSE_VALUES = {"0", "false", "no", "нет", "-"}
+
+
+class ImportRowError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f"Строка {line}: {message}")
+
+
+def guess_format(path):
+    return "jsonl" if str(path).endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(stream, fmt):
+    """Построчно читает файл: (номер строки, словарь). Пустые значения CSV считаются не заданными"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in (None, "")}
+        return
+    for line, text in enumerate(stream, 1):
+        if text.strip():
+            try:
+                row = json.loads(text)
+            except ValueError as error:
+                raise ImportRowError(line, f"некорректный JSON ({error})")
+            yield line, {key: value for key, value in row.items() if value is not None}
+
+
+def _parse_bool(line, value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ImportRowError(line, f"не удалось разобрать available={value!r}")
+
+
+def _parse_values(line, model, data):
+    """Поля модели из строки файла (без parent)"""
+    values = {}
+    for field in ("name", "description"):
+        if field in data:
+            values[field] = str(data[field]).strip()
+    if "available" in data:
+        values["available"] = _parse_bool(line, data["available"])
+    if "popularity" in data:
+        try:
+            values["popularity"] = max(int(data["popularity"]), 0)
+        except (TypeError, ValueError):
+            raise ImportRowError(line, f"не удалось разобрать popularity={data['popularity']!r}")
+    if "price" in data and model is not Category:
+        try:
+            values["price"] = Decimal(str(data["price"]).replace(",", ".").replace(" ", ""))
+        except InvalidOperation:
+            raise ImportRowError(line, f"не удалось разобрать price={data['price']!r}")
+    return values
+
+
+class CatalogImporter:
+    """Загружает строки каталога пачками: на пачку - несколько запросов вместо нескольких на объект.
+
+    Существующие объекты ищутся по slug и обновляются через bulk_update, новые
+    получают slug из allocate_slugs и создаются через bulk_create. Как и в save(),
+    при смене названия slug выдается заново; строки этого же файла могут ссылаться
+    на родителя и по прежнему slug. Родители
+    (категория товара, товар услуги) ищутся по slug, в том числе среди созданных
+    ранее в этом же файле. Сигналы save при этом не отправляются, поэтому
+    поисковый индекс обновляется здесь же, а версия каталога - после коммита.
+    """
+
+    def __init__(self, chunk_size=1000):
+        self.chunk_size = chunk_size
+        self.pending = {model: {} for model in TYPES.values()}  # модель -> {ключ: (строка, данные)}
+        self.pending_count = 0
+        self.ids = {model: {} for model in TYPES.values()}  # модель -> {slug: pk}
+        self.created = {model: 0 for model in TYPES.values()}
+        self.updated = {model: 0 for model in TYPES.values()}
+
+    def add(self, line, data):
+        model = TYPES.get(str(data.get("type", "")).strip().lower())
+        if model is None:
+            raise ImportRowError(line, f"неизвестный type={data.get('type')!r}, ожидается {', '.join(TYPES)}")
+        slug = str(data.get("slug", "")).strip()
+        # Повтор slug в пачке - последняя строка побеждает; строки без slug всегда создают новый объект
+        self.pending[model][slug or ("new", line)] = (line, data)
+        self.pending_count += 1
+        if self.pending_count >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        # Сначала родители, чтобы товары и услуги из той же пачки их нашли
+        for model in TYPES.values():
+            rows = list(self.pending[model].values())
+            if rows:
+                self._flush_model(model, rows)
+            self.pending[model].clear()
+        self.pending_count = 0
+
+    def _resolve_parents(self, model, rows):
+        field, parent_model = PARENTS[model]
+        known = self.ids[parent_model]
+        wanted = {str(data["parent"]).strip() for _, data in rows if data.get("parent")} - known.keys()
+        if wanted:
+            known.update(parent_model.objects.filter(slug__in=wanted).values_list("slug", "pk"))
+        return field, known
+
+    def _flush_model(self, model, rows):
+        slugs = [str(data["slug"]).strip() for _, data in rows if data.get("slug")]
+        existing = {obj.slug: obj for obj in model.objects.filter(slug__in=slugs)}
+        parent_field, parent_ids = self._resolve_parents(model, rows) if model in PARENTS else (None, {})
+
+        now = timezone.now()
+        max_length = model._meta.get_field("slug").max_length
+        to_create, bases, to_update, update_fields = [], [], [], {"date_updated"}
+        renamed, renamed_bases = [], []
+        for line, data in rows:
+            values = _parse_values(line, model, data)
+            if parent_field and data.get("parent"):
+                parent_slug = str(data["parent"]).strip()
+                if parent_slug not in parent_ids:
+                    raise ImportRowError(line, f"не найден {parent_field} со slug {parent_slug!r}")
+                values[f"{parent_field}_id"] = parent_ids[parent_slug]
+
+            obj = existing.get(str(data.get("slug", "")).strip())
+            if obj is not None:
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                obj.date_updated = now
+                update_fields.update(values)
+                to_update.append(obj)
+                base = create_slug(values["name"]) if "name" in values else None
+                if base and not slug_has_base(obj.slug, base, max_length):
+                    renamed.append(obj)
+                    renamed_bases.append(base)
+                continue
+
+            required = ["name"] + (["price", f"{parent_field}_id"] if parent_field else [])
+            missing = [field.removesuffix("_id") for field in required if field not in values]
+            if missing:
+                raise ImportRowError(line, f"для нового объекта не хватает: {', '.join(missing)}")
+            to_create.append(model(**values))
+            bases.append(str(data.get("slug", "")).strip() or create_slug(values["name"]))
+
+        old_slugs = {}
+        for obj, slug in zip(to_create + renamed, allocate_slugs(model, bases + renamed_bases)):
+            if obj.pk is not None:
+                old_slugs[obj.slug] = obj.pk
+                update_fields.add("slug")
+            obj.slug = slug
+        model.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        if to_update:
+            model.objects.bulk_update(to_update, sorted(update_fields), batch_size=self.chunk_size)
+
+        index_objects(to_create + to_update)
+        self.ids[model].update(old_slugs)
+        self.ids[model].update((obj.slug, obj.pk) for obj in to_create + to_update)
+        self.created[model] += len(to_create)
+        self.updated[model] += len(to_update)
+
+
+def import_catalog(stream, fmt, chunk_size=1000, dry_run=False):
+    """Импортирует каталог одной транзакцией; ошибка в любой строке откатывает весь файл"""
+    importer = CatalogImporter(chunk_size=chunk_size)
+    with transaction.atomic():
+        for line, data in read_rows(stream, fmt):
+            importer.add(line, data)
+        importer.flush()
+        if dry_run:
+            transaction.set_rollback(True)
+        else:
+            # Сигналы не отправлялись: сбрасываем кэш страниц и снимок каталога сами
+            transaction.on_commit(bump_catalog_version)
+    return importer
+
+
+def export_rows(chunk_size=2000):
+    """Строки каталога в порядке категории, товары, услуги; в памяти - не больше chunk_size объектов"""
+    categories = Category.objects.order_by("pk").values_list("slug", "name", "available", "popularity", "description")
+    for slug, name, available, popularity, description in categories.iterator(chunk_size=chunk_size):
+        yield {"type": "category", "slug": slug, "name": name, "parent": None, "price": None,
+               "available": available, "popularity": popularity, "description": description}
+
+    products = Product.objects.order_by("pk").values_list(
+        "slug", "name", "category__slug", "price", "available", "popularity", "description"
+    )
+    for slug, name, parent, price, available, popularity, description in products.iterator(chunk_size=chunk_size):
+        yield {"type": "product", "slug": slug, "name": name, "parent": parent, "price": price,
+               "available": available, "popularity": popularity, "description": description}
+
+    services = Service.objects.order_by("pk").values_list(
+        "slug", "name", "product__slug", "price", "available", "popularity", "description"
+    )
+    for slug, name, parent, price, available, popularity, description in services.iterator(chunk_size=chunk_size):
+        yield {"type": "service", "slug": slug, "name": name, "parent": parent, "price": price,
+               "available": available, "popularity": popularity, "description": description}
+
+
+def write_rows(rows, stream, fmt):
+    """Пишет строки в поток по одной; возвращает их число"""
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            row["available"] = int(row["available"])
+            writer.writerow(["" if row[column] is None else row[column] for column in COLUMNS])
+            count += 1
+        return count
+    for row in rows:
+        if row["price"] is not None:
+            row["price"] = str(row["price"])
+        stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+        count += 1
+    return count
@@ -1,6 +1,8 @@
-from .models import Category
+from django.utils.functional import SimpleLazyObject
+
+from .cache import get_available_categories
 
 def categories_context(request):
     return {
-        'categories': Category.objects.filter(available=True)
-    }
\ No newline at end of file
+        'categories': SimpleLazyObject(get_available_categories)
+    }
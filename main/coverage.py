@@ -0,0 +1,158 @@
+from collections import defaultdict
+
+from .models import Employee, EmployeeCategory, Specialization
+
+
+# Таблицы связей, из которых собирается покрытие
+EmployeeCategories = Employee.categories.through
+EmployeeSpecializations = Employee.specialization.through
+SpecializationCategories = Specialization.categories.through
+
+
+def covering_employees(category_ids):
+    """Сотрудники, которые работают хотя бы с одной из категорий (напрямую или через специализацию)"""
+    return Employee.objects.filter(
+        pk__in=EmployeeCategory.objects.filter(category__in=category_ids).values("employee")
+    )
+
+
+def _create(rows):
+    # Повторы отсекаются уникальными ограничениями
+    EmployeeCategory.objects.bulk_create(rows, ignore_conflicts=True, batch_size=500)
+
+
+def add_direct(employee_ids, category_ids):
+    _create([
+        EmployeeCategory(employee_id=employee_id, category_id=category_id, source="direct")
+        for employee_id in employee_ids
+        for category_id in category_ids
+    ])
+
+
+def remove_direct(**filters):
+    EmployeeCategory.objects.filter(source="direct", **filters).delete()
+
+
+def add_specialization(specialization_ids, employee_ids=None, category_ids=None):
+    """Добавляет покрытие от специализаций, при необходимости только для части сотрудников/категорий"""
+    employees = EmployeeSpecializations.objects.filter(specialization_id__in=specialization_ids)
+    if employee_ids is not None:
+        employees = employees.filter(employee_id__in=employee_ids)
+    categories = SpecializationCategories.objects.filter(specialization_id__in=specialization_ids)
+    if category_ids is not None:
+        categories = categories.filter(category_id__in=category_ids)
+
+    categories_by_specialization = defaultdict(list)
+    for specialization_id, category_id in categories.values_list("specialization_id", "category_id"):
+        categories_by_specialization[specialization_id].append(category_id)
+
+    _create([
+        EmployeeCategory(
+            employee_id=employee_id, category_id=category_id,
+            source="specialization", specialization_id=specialization_id,
+        )
+        for employee_id, specialization_id in employees.values_list("employee_id", "specialization_id")
+        for category_id in categories_by_specialization[specialization_id]
+    ])
+
+
+def remove_specialization(**filters):
+    EmployeeCategory.objects.filter(source="specialization", **filters).delete()
+
+
+def employee_categories_changed(instance, action, reverse, pk_set):
+    """m2m_changed для Employee.categories"""
+    if reverse:
+        # instance - категория, pk_set - сотрудники
+        if action == "post_add":
+            add_direct(pk_set, [instance.pk])
+        elif action == "post_remove":
+            remove_direct(category=instance.pk, employee__in=pk_set)
+        elif action == "post_clear":
+            remove_direct(category=instance.pk)
+    else:
+        if action == "post_add":
+            add_direct([instance.pk], pk_set)
+        elif action == "post_remove":
+            remove_direct(employee=instance.pk, category__in=pk_set)
+        elif action == "post_clear":
+            remove_direct(employee=instance.pk)
+
+
+def employee_specializations_changed(instance, action, reverse, pk_set):
+    """m2m_changed для Employee.specialization"""
+    if reverse:
+        # instance - специализация, pk_set - сотрудники
+        if action == "post_add":
+            add_specialization([instance.pk], employee_ids=pk_set)
+        elif action == "post_remove":
+            remove_specialization(specialization=instance.pk, employee__in=pk_set)
+        elif action == "post_clear":
+            remove_specialization(specialization=instance.pk)
+    else:
+        if action == "post_add":
+            add_specialization(pk_set, employee_ids=[instance.pk])
+        elif action == "post_remove":
+            remove_specialization(employee=instance.pk, specialization__in=pk_set)
+        elif action == "post_clear":
+            remove_specialization(employee=instance.pk)
+
+
+def specialization_categories_changed(instance, action, reverse, pk_set):
+    """m2m_changed для Specialization.categories"""
+    if reverse:
+        # instance - категория, pk_set - специализации
+        if action == "post_add":
+            add_specialization(pk_set, category_ids=[instance.pk])
+        elif action == "post_remove":
+            remove_specialization(category=instance.pk, specialization__in=pk_set)
+        elif action == "post_clear":
+            remove_specialization(category=instance.pk)
+    else:
+        if action == "post_add":
+            add_specialization([instance.pk], category_ids=pk_set)
+        elif action == "post_remove":
+            remove_specialization(specialization=instance.pk, category__in=pk_set)
+        elif action == "post_clear":
+            remove_specialization(specialization=instance.pk)
+
+
+def expected_coverage():
+    """Покрытие, посчитанное заново по таблицам связей: множество (сотрудник, категория, источник, специализация)"""
+    rows = {
+        (employee_id, category_id, "direct", None)
+        for employee_id, category_id in EmployeeCategories.objects.values_list("employee_id", "category_id")
+    }
+    categories_by_specialization = defaultdict(list)
+    for specialization_id, category_id in SpecializationCategories.objects.values_list("specialization_id", "category_id"):
+        categories_by_specialization[specialization_id].append(category_id)
+    for employee_id, specialization_id in EmployeeSpecializations.objects.values_list("employee_id", "specialization_id"):
+        for category_id in categories_by_specialization[specialization_id]:
+            rows.add((employee_id, category_id, "specialization", specialization_id))
+    return rows
+
+
+def current_coverage():
+    return {
+        (employee_id, category_id, source, specialization_id): pk
+        for pk, employee_id, category_id, source, specialization_id in EmployeeCategory.objects.values_list(
+            "pk", "employee_id", "category_id", "source", "specialization_id"
+        )
+    }
+
+
+def diff_coverage():
+    """Возвращает (недостающие строки, pk лишних строк)"""
+    expected = expected_coverage()
+    current = current_coverage()
+    missing = expected - current.keys()
+    extra = [pk for row, pk in current.items() if row not in expected]
+    return missing, extra
+
+
+def repair_coverage(missing, extra):
+    EmployeeCategory.objects.filter(pk__in=extra).delete()
+    _create([
+        EmployeeCategory(employee_id=employee_id, category_id=category_id, source=source, specialization_id=specialization_id)
+        for employee_id, category_id, source, specialization_id in missing
+    ])
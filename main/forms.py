@@ -1,9 +1,9 @@
 from django import forms
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Q
 
 from phonenumber_field.formfields import PhoneNumberField
 from .models import Order, JobApplication, Employee, Category, Product, Service, Specialization
+from .coverage import covering_employees
 
 class CategoryForm(forms.ModelForm):
     specializations = forms.ModelMultipleChoiceField(
@@ -31,13 +31,7 @@ class CategoryForm(forms.ModelForm):
     def save(self, commit=True):
         category = super().save(commit)
         if commit:
-            specializations = self.cleaned_data['specializations']
-            # Обновляем связи
-            for spec in Specialization.objects.all():
-                if spec in specializations:
-                    spec.categories.add(category)
-                else:
-                    spec.categories.remove(category)
+            category.set_specializations(self.cleaned_data['specializations'])
         return category
 
 class ProductForm(forms.ModelForm):
@@ -515,12 +509,10 @@ class OrderEditForm(forms.ModelForm):
             if self.instance.categories.exists():
                 categories = self.instance.categories.all()
                 self.fields['products'].queryset = Product.objects.filter(category__in=categories, available=True)
-                self.fields['assigned_employees'].queryset = Employee.objects.filter(
-                    Q(specialization__categories__in=categories) |
-                    Q(categories__in=categories),
+                self.fields['assigned_employees'].queryset = covering_employees(categories).filter(
                     available=True, 
                     status='active'
-                ).distinct()
+                )
         
         # Обновляем queryset на основе POST данных
         if self.data:
@@ -528,12 +520,10 @@ class OrderEditForm(forms.ModelForm):
                 category_ids = self.data.getlist('categories')
                 if category_ids:
                     self.fields['products'].queryset = Product.objects.filter(category__in=category_ids, available=True)
-                    self.fields['assigned_employees'].queryset = Employee.objects.filter(
-                        Q(specialization__categories__in=category_ids) |
-                        Q(categories__in=category_ids),
+                    self.fields['assigned_employees'].queryset = covering_employees(category_ids).filter(
                         available=True, 
                         status='active'
-                    ).distinct()
+                    )
             except (ValueError, TypeError):
                 pass
 
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import ExifTags, Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# Ширины уменьшенных копий для srcset
+RESPONSIVE_WIDTHS = getattr(settings, "RESPONSIVE_IMAGE_WIDTHS", (320, 640, 960))
+
+# Список готовых копий записывается в манифест рядом с оригиналом и кэшируется:
+# страница не проверяет файлы копий, а при промахе кэша читает один манифест.
+# Пока манифеста нет (копии создаются в фоне), запись в кэше живет недолго
+DERIVATIVES_CACHE_TIMEOUT = 60 * 60 * 24
+DERIVATIVES_MISSING_TIMEOUT = 60
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, "IMAGE_WORKERS", 2), thread_name_prefix="images")
+
+
+def derivative_name(name, width, ext=None):
+    """Имя уменьшенной копии рядом с оригиналом: photo.jpg -> photo_320w.jpg / photo_320w.webp"""
+    root, original_ext = os.path.splitext(name)
+    return f"{root}_{width}w{ext or original_ext}"
+
+
+def manifest_name(name):
+    """Манифест копий рядом с оригиналом: photo.jpg -> photo_derivatives.json"""
+    return f"{os.path.splitext(name)[0]}_derivatives.json"
+
+
+def _derivatives_key(name):
+    return f"main:derivatives:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def _urls(manifest):
+    return {kind: [(width, default_storage.url(path)) for width, path in manifest.get(kind, [])] for kind in ("original", "webp")}
+
+
+def _write_manifest(name, manifest):
+    path = manifest_name(name)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    default_storage.save(path, ContentFile(json.dumps(manifest).encode()))
+    cache.set(_derivatives_key(name), _urls(manifest), DERIVATIVES_CACHE_TIMEOUT)
+
+
+def get_derivatives(name):
+    """Возвращает готовые копии: {"original": [(ширина, url)], "webp": [(ширина, url)]}.
+
+    Файлы копий не проверяются: список берется из кэша, при промахе - из манифеста
+    """
+    key = _derivatives_key(name)
+    result = cache.get(key)
+    if result is not None:
+        return result
+    try:
+        with default_storage.open(manifest_name(name)) as f:
+            result = _urls(json.load(f))
+        timeout = DERIVATIVES_CACHE_TIMEOUT
+    except (OSError, ValueError):
+        result = {"original": [], "webp": []}
+        timeout = DERIVATIVES_MISSING_TIMEOUT
+    cache.set(key, result, timeout)
+    return result
+
+
+# Ориентации EXIF, при которых exif_transpose меняет местами ширину и высоту
+_ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def generate_derivatives(name):
+    """Создает уменьшенные копии изображения и их WebP-версии, пропуская уже готовые.
+
+    Записывает манифест копий, если его нет или появились новые копии. Возвращает созданные файлы
+    """
+    if not name or not default_storage.exists(name):
+        return []
+
+    save_format = (Image.registered_extensions().get(os.path.splitext(name)[1].lower()) or "JPEG")
+    with default_storage.open(name) as f:
+        # Image.open читает только заголовок: размеров хватает, чтобы понять, каких копий не хватает
+        image = Image.open(f)
+        width, height = image.size
+        if image.getexif().get(ExifTags.Base.Orientation) in _ROTATED_ORIENTATIONS:
+            width, height = height, width
+        targets = [target for target in RESPONSIVE_WIDTHS if target < width]
+        manifest = {
+            "original": [(target, derivative_name(name, target)) for target in targets],
+            "webp": [(target, derivative_name(name, target, ".webp")) for target in targets],
+        }
+        missing = {
+            (target, fmt, ext)
+            for target in targets
+            for fmt, ext in ((save_format, None), ("WEBP", ".webp"))
+            if not default_storage.exists(derivative_name(name, target, ext))
+        }
+        if not missing:
+            if not default_storage.exists(manifest_name(name)):
+                _write_manifest(name, manifest)
+            return []
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    created = []
+    for width in RESPONSIVE_WIDTHS:
+        if width >= image.width:
+            break
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        for fmt, ext in ((save_format, None), ("WEBP", ".webp")):
+            if (width, fmt, ext) not in missing:
+                continue
+            path = derivative_name(name, width, ext)
+            output = resized
+            if fmt == "JPEG" and output.mode not in ("RGB", "L"):
+                output = output.convert("RGB")
+            buffer = BytesIO()
+            output.save(buffer, format=fmt, quality=82, optimize=True)
+            created.append(default_storage.save(path, ContentFile(buffer.getvalue())))
+    _write_manifest(name, manifest)
+    return created
+
+
+def delete_derivatives(name):
+    """Удаляет копии и манифест изображения name (сам оригинал не трогает)"""
+    paths = [derivative_name(name, width, ext) for width in RESPONSIVE_WIDTHS for ext in (None, ".webp")]
+    for path in (*paths, manifest_name(name)):
+        if default_storage.exists(path):
+            default_storage.delete(path)
+    cache.delete(_derivatives_key(name))
+
+
+def _generate_safely(name, on_ready):
+    try:
+        if generate_derivatives(name) and on_ready:
+            on_ready()
+    except Exception as e:
+        logger.error(f"Ошибка при создании копий изображения {name}: {e}")
+
+
+def schedule_derivatives(name, on_ready=None):
+    """Ставит создание копий в пул фоновых потоков, не задерживая запрос.
+
+    on_ready вызывается, когда копии созданы: например, чтобы сбросить кэш страниц,
+    закэшированных с обычным <img> без srcset
+    """
+    if name:
+        _executor.submit(_generate_safely, name, on_ready)
+
+
+# Фото к заказам: уменьшение, поворот по EXIF, удаление метаданных
+
+ORDER_PHOTO_MAX_SIDE = getattr(settings, "ORDER_PHOTO_MAX_SIDE", 2048)
+ORDER_PHOTO_THUMB_SIDE = getattr(settings, "ORDER_PHOTO_THUMB_SIDE", 400)
+
+_process_pool = None
+
+
+# Подкаталоги рядом с фото для производных файлов: загруженные фото туда не попадают
+ORDER_PHOTO_THUMBS_DIR = "thumbs"
+ORDER_PHOTO_CONVERTED_DIR = "converted"
+
+
+def _reserve_path(path):
+    """Атомарно создает пустой файл path, а если имя занято - path_1, path_2 и т.д. Возвращает созданный путь.
+
+    Имена выбираются в процессах пула, поэтому проверка exists() с последующей записью не годится:
+    два фото с одинаковым именем (второе загружено после удаления первого оригинала) затерли бы друг друга
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    root, ext = os.path.splitext(path)
+    candidate, n = path, 0
+    while True:
+        try:
+            os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return candidate
+        except FileExistsError:
+            n += 1
+            candidate = f"{root}_{n}{ext}"
+
+
+def normalize_photo(path, max_side=ORDER_PHOTO_MAX_SIDE, thumb_side=ORDER_PHOTO_THUMB_SIDE):
+    """Пережимает фото в JPEG без метаданных и создает миниатюру.
+
+    Работает только с файлами на диске и Pillow, поэтому выполняется в отдельном процессе.
+    Возвращает абсолютные пути (фото, миниатюра): photo.png -> converted/photo.jpg, thumbs/photo.jpg.
+    Если фото сохранено под новым именем (не JPEG), оригинал не удаляется:
+    его удаляет _store_order_photo после записи в базу.
+    """
+    directory, filename = os.path.split(path)
+    root, ext = os.path.splitext(filename)
+    reserved = []
+    try:
+        if ext.lower() in (".jpg", ".jpeg"):
+            photo_path = path
+        else:
+            photo_path = _reserve_path(os.path.join(directory, ORDER_PHOTO_CONVERTED_DIR, f"{root}.jpg"))
+            reserved.append(photo_path)
+        thumb_path = _reserve_path(os.path.join(directory, ORDER_PHOTO_THUMBS_DIR, f"{root}.jpg"))
+        reserved.append(thumb_path)
+
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            # Новый файл сохраняется без exif/icc, поэтому геометки и данные камеры пропадают
+            image.save(f"{photo_path}.tmp", format="JPEG", quality=85, optimize=True, progressive=True)
+            image.thumbnail((thumb_side, thumb_side), Image.Resampling.LANCZOS)
+            image.save(thumb_path, format="JPEG", quality=80, optimize=True)
+        os.replace(f"{photo_path}.tmp", photo_path)
+    except Exception:
+        for reserved_path in reserved:
+            os.remove(reserved_path)
+        raise
+    return photo_path, thumb_path
+
+
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        # Не fork: процесс gunicorn уже держит пулы потоков (популярность, копии изображений),
+        # а их блокировки в дочернем процессе после fork могут остаться захваченными навсегда
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _process_pool = ProcessPoolExecutor(
+            max_workers=getattr(settings, "IMAGE_WORKERS", 2), mp_context=multiprocessing.get_context(method)
+        )
+    return _process_pool
+
+
+def _relative_name(path):
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+
+
+def _store_order_photo(pk, original_path, future):
+    from .models import OrderImage
+
+    try:
+        photo_path, thumb_path = future.result()
+        updated = OrderImage.objects.filter(pk=pk).update(
+            image=_relative_name(photo_path), thumbnail=_relative_name(thumb_path)
+        )
+        if not updated:
+            # Фото удалили, пока оно обрабатывалось: на эти файлы больше никто не ссылается
+            for path in {original_path, photo_path, thumb_path}:
+                if os.path.exists(path):
+                    os.remove(path)
+        # Оригинал удаляем только после записи в базу: если UPDATE не прошел, запись указывает на него
+        elif photo_path != original_path:
+            os.remove(original_path)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке фото заказа #{pk}: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_order_photos(images):
+    """Отправляет фото заказа на обработку в пул процессов"""
+    pool = _get_process_pool()
+    for image in images:
+        path = default_storage.path(image.image.name)
+        future = pool.submit(normalize_photo, path)
+        future.add_done_callback(lambda f, pk=image.pk, path=path: _store_order_photo(pk, path, f))
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.recommendations import MasterIndex, MasterProfile, STATUS_WEIGHTS
+
+
+CITIES = ["Москва", "Химки", "Мытищи", "Королев", "Балашиха", "Подольск", "Люберцы", "Красногорск"]
+
+
+class Command(BaseCommand):
+    help = "Замеряет скорость подбора мастеров на синтетических данных или на данных из базы (--db)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--masters", type=int, default=500)
+        parser.add_argument("--orders", type=int, default=30000, help="Сколько заказов распределить между мастерами")
+        parser.add_argument("--categories", type=int, default=40)
+        parser.add_argument("--products", type=int, default=400)
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--top", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--db", action="store_true", help="Загрузить индекс из базы вместо синтетических данных")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        index = MasterIndex()
+
+        started = time.perf_counter()
+        if options["db"]:
+            index.load()
+            category_ids = list(index.by_category) or [0]
+            product_ids = list(index.by_product) or [0]
+        else:
+            category_ids = list(range(1, options["categories"] + 1))
+            product_ids = list(range(1, options["products"] + 1))
+            self.fill(index, rng, options, category_ids, product_ids)
+        build_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"Индекс: {len(index.profiles)} мастеров, построен за {build_ms:.1f} мс")
+
+        timings = []
+        for _ in range(options["queries"]):
+            categories = rng.sample(category_ids, min(len(category_ids), rng.randint(1, 3)))
+            products = rng.sample(product_ids, min(len(product_ids), rng.randint(0, 4)))
+            city = rng.choice(CITIES)
+            started = time.perf_counter()
+            index.recommend(categories, products, city, k=options["top"], refresh=False)
+            timings.append((time.perf_counter() - started) * 1000)
+        self.report("Подбор top-%d" % options["top"], timings)
+
+        # Инкрементальное обновление: один мастер сменил категории и загрузку
+        timings = []
+        profiles = list(index.profiles.values())
+        for _ in range(min(options["queries"], 1000)):
+            profile = rng.choice(profiles)
+            started = time.perf_counter()
+            index.add(MasterProfile(
+                profile.id, profile.name, profile.city, profile.experience, profile.status,
+                rng.sample(category_ids, min(len(category_ids), 3)), profile.products,
+                profile.service_products, rng.randint(0, 5),
+            ))
+            timings.append((time.perf_counter() - started) * 1000)
+        self.report("Обновление профиля", timings)
+
+    def fill(self, index, rng, options, category_ids, product_ids):
+        workload = [0] * options["masters"]
+        for _ in range(options["orders"]):
+            # Около пятой части заказов открыты (подтверждены или в работе)
+            if rng.random() < 0.2:
+                workload[rng.randrange(options["masters"])] += 1
+        for pk in range(1, options["masters"] + 1):
+            categories = rng.sample(category_ids, min(len(category_ids), rng.randint(1, 6)))
+            products = rng.sample(product_ids, min(len(product_ids), rng.randint(0, 20)))
+            index.add(MasterProfile(
+                pk, f"Мастер {pk}", rng.choice(CITIES), rng.randint(0, 25), rng.choice(list(STATUS_WEIGHTS)),
+                categories, products, products[: len(products) // 2], workload[pk - 1],
+            ))
+
+    def report(self, title, timings):
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f"{title}: {len(timings)} раз, медиана {statistics.median(timings):.3f} мс, "
+            f"p95 {p95:.3f} мс, p99 {p99:.3f} мс, максимум {timings[-1]:.3f} мс"
+        )
@@ -0,0 +1,65 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.text import slugify
+from transliterate import translit
+
+from main.models import create_slug
+
+
+WORDS = [
+    "Замена", "Ремонт", "Установка", "Чистка", "Диагностика", "Подключение", "смесителя", "унитаза",
+    "стиральной", "посудомоечной", "машины", "бойлера", "розетки", "люстры", "счётчика", "фильтра",
+]
+NAMES = ["Иван", "Пётр", "Сергей", "Алексей", "Юрий", "Щукин", "Жуков", "Чернышёв", "Шевцов", "Цветков"]
+
+
+def translit_slug(text):
+    """create_slug до оптимизации: полная транслитерация на каждый вызов"""
+    return slugify(translit(text, "ru", reversed=True))
+
+
+class Command(BaseCommand):
+    help = "Замеряет скорость create_slug: полная транслитерация, таблица без кэша и с кэшем"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--names", type=int, default=20000, help="Сколько названий обработать за прогон")
+        parser.add_argument("--distinct", type=int, default=500, help="Сколько среди них разных")
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = [
+            " ".join(rng.sample(WORDS, rng.randint(2, 4))) if rng.random() < 0.7 else f"{rng.choice(NAMES)}-{rng.choice(NAMES)}"
+            for _ in range(options["distinct"])
+        ]
+        texts = [rng.choice(vocabulary) for _ in range(options["names"])]
+
+        mismatches = sum(translit_slug(text) != create_slug.__wrapped__(text) for text in vocabulary)
+        self.stdout.write(f"Расхождений с полной транслитерацией: {mismatches} из {len(vocabulary)}")
+
+        baseline = self.measure("translit + slugify", translit_slug, texts, options["rounds"])
+        self.measure("Таблица, без кэша", create_slug.__wrapped__, texts, options["rounds"], baseline)
+
+        create_slug.cache_clear()
+        self.measure("Таблица + LRU", create_slug, texts, options["rounds"], baseline)
+        info = create_slug.cache_info()
+        self.stdout.write(f"Кэш: {info.hits} попаданий, {info.misses} промахов, размер {info.currsize}/{info.maxsize}")
+
+    def measure(self, title, func, texts, rounds, baseline=None):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for text in texts:
+                func(text)
+            timings.append((time.perf_counter() - started) * 1000)
+        median = statistics.median(timings)
+        speedup = f", быстрее в {baseline / median:.1f} раза" if baseline else ""
+        self.stdout.write(
+            f"{title}: {len(texts)} названий, медиана {median:.1f} мс "
+            f"({median * 1000 / len(texts):.2f} мкс на название){speedup}"
+        )
+        return median
@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from main.images import generate_derivatives
+from main.models import Category, Product, Employee
+
+
+class Command(BaseCommand):
+    help = "Создает уменьшенные копии (srcset и WebP) для уже загруженных изображений"
+
+    def handle(self, *args, **options):
+        sources = [
+            (Category, "image"),
+            (Product, "image"),
+            (Employee, "image"),
+            (get_user_model(), "avatar"),
+        ]
+        total = 0
+        for model, field in sources:
+            names = model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).values_list(field, flat=True)
+            for name in names.iterator(chunk_size=500):
+                try:
+                    total += len(generate_derivatives(name))
+                except Exception as e:
+                    self.stderr.write(f"{name}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Создано копий: {total}"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.catalog_io import FORMATS, export_rows, guess_format, write_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгружает категории, товары и услуги в CSV или JSON Lines в формате catalog_import. "
+        "Строки читаются из базы пачками, поэтому память не растет с размером каталога"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", "-o", default="-", help="Путь к файлу или - для стандартного вывода")
+        parser.add_argument("--format", choices=FORMATS, help="По умолчанию - по расширению файла, для вывода - csv")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Сколько строк читать из базы за раз")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["output"])
+        started = time.perf_counter()
+        rows = export_rows(chunk_size=options["chunk_size"])
+        if options["output"] == "-":
+            count = write_rows(rows, self.stdout, fmt)
+            report = self.stderr
+        else:
+            with open(options["output"], "w", encoding="utf-8", newline="") as stream:
+                count = write_rows(rows, stream, fmt)
+            report = self.stdout
+        elapsed = time.perf_counter() - started
+        report.write(f"Выгружено {count} строк за {elapsed:.2f} с ({count / max(elapsed, 1e-9):.0f} в секунду)")
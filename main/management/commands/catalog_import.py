@@ -0,0 +1,47 @@
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.catalog_io import COLUMNS, FORMATS, ImportRowError, guess_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает категории, товары и услуги из CSV или JSON Lines (по объекту на строку). "
+        f"Столбцы: {', '.join(COLUMNS)}. Объекты с существующим slug обновляются, остальные создаются; "
+        "parent - slug категории для товара и slug товара для услуги"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу или - для стандартного ввода")
+        parser.add_argument("--format", choices=FORMATS, help="По умолчанию - по расширению файла")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Сколько строк записывать за раз")
+        parser.add_argument("--dry-run", action="store_true", help="Проверить файл и откатить изменения")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or guess_format(options["path"])
+        started = time.perf_counter()
+        try:
+            if options["path"] == "-":
+                # Кодировка консоли может быть любой, а файл выгрузки - в UTF-8 с BOM
+                stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+                importer = import_catalog(stream, fmt, options["chunk_size"], options["dry_run"])
+            else:
+                with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+                    importer = import_catalog(stream, fmt, options["chunk_size"], options["dry_run"])
+        except (OSError, ImportRowError) as error:
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - started
+
+        total = 0
+        for model, created in importer.created.items():
+            updated = importer.updated[model]
+            total += created + updated
+            self.stdout.write(f"{model._meta.verbose_name_plural}: создано {created}, обновлено {updated}")
+        self.stdout.write(f"Всего {total} за {elapsed:.2f} с ({total / max(elapsed, 1e-9):.0f} в секунду)")
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Пробный запуск: изменения откачены"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Каталог загружен"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.coverage import diff_coverage, repair_coverage
+
+
+class Command(BaseCommand):
+    help = "Сверяет таблицу покрытия категорий сотрудниками со связями и исправляет расхождения"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Только проверить, ничего не меняя")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            missing, extra = diff_coverage()
+            self.stdout.write(f"Недостает строк: {len(missing)}, лишних строк: {len(extra)}")
+            if not missing and not extra:
+                self.stdout.write(self.style.SUCCESS("Покрытие категорий согласовано"))
+                return
+            if options["check"]:
+                raise CommandError("Покрытие категорий расходится со связями сотрудников и специализаций")
+            repair_coverage(missing, extra)
+        self.stdout.write(self.style.SUCCESS("Покрытие категорий перестроено"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from main.models import Category, Product, Order
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает популярность категорий и товаров по истории заказов"
+
+    def handle(self, *args, **options):
+        sources = [
+            (Category, Order.categories.through, "category_id"),
+            (Product, Order.products.through, "product_id"),
+        ]
+        with transaction.atomic():
+            for model, through, field in sources:
+                counts = dict(
+                    through.objects.values_list(field).annotate(n=Count("order_id")).order_by()
+                )
+                objects = list(model.objects.only("id", "popularity"))
+                for obj in objects:
+                    obj.popularity = counts.get(obj.id, 0)
+                model.objects.bulk_update(objects, ["popularity"], batch_size=500)
+                self.stdout.write(
+                    f"{model._meta.verbose_name_plural}: обновлено {len(objects)}, "
+                    f"в заказах {len(counts)}"
+                )
+        self.stdout.write(self.style.SUCCESS("Популярность пересчитана"))
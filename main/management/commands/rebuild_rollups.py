@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает сводки панели управления (заказы и анкеты по дням, мастера по городам) "
+        "по всей истории и исправляет расхождения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Только проверить, ничего не меняя")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = rebuild_rollups(dry_run=options["check"])
+        for model, count in changed.items():
+            self.stdout.write(f"{model._meta.verbose_name_plural}: неверных строк {count}")
+        if not any(changed.values()):
+            self.stdout.write(self.style.SUCCESS("Сводки согласованы"))
+            return
+        if options["check"]:
+            raise CommandError("Сводки расходятся с заказами, анкетами и мастерами")
+        self.stdout.write(self.style.SUCCESS("Сводки перестроены"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.search import KINDS, rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс поиска по заказам, сотрудникам, анкетам и каталогу"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500, help="Сколько объектов читать и записывать за раз")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = rebuild_index(chunk_size=options["chunk_size"])
+        for kind, count in counts.items():
+            self.stdout.write(f"{KINDS[kind]._meta.verbose_name_plural}: {count}")
+        self.stdout.write(self.style.SUCCESS("Поисковый индекс перестроен"))
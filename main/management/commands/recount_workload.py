@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from main.cache import record_master_changes
+from main.workload import recount_workload
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счетчики загрузки мастеров по заказам. Запускать раз в сутки: "
+        "выполненные заказы старше 30 дней выпадают из счетчика только при пересчете"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Только проверить, ничего не меняя")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            changed = recount_workload(dry_run=options["check"])
+        self.stdout.write(f"Мастеров с расхождениями: {len(changed)}")
+        if options["check"] and changed:
+            raise CommandError("Счетчики загрузки расходятся с заказами")
+        if changed:
+            record_master_changes(employee.pk for employee in changed)
+        self.stdout.write(self.style.SUCCESS("Счетчики загрузки в порядке"))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.models import Notification
+from main.notifications import deliver_pending, get_transport
+
+
+class Command(BaseCommand):
+    help = "Отправляет уведомления из очереди (Telegram) с повторными попытками"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Отправить накопившееся и выйти")
+        parser.add_argument("--interval", type=float, default=5, help="Пауза между проверками очереди, сек")
+
+    def handle(self, *args, **options):
+        # Уведомления, которые предыдущий процесс не успел отправить, возвращаем в очередь
+        Notification.objects.filter(status="sending").update(status="pending")
+
+        # Один транспорт на весь процесс: соединение с Telegram переиспользуется между сообщениями
+        transport = get_transport()
+        try:
+            while True:
+                sent, failed = deliver_pending(transport)
+                if sent or failed:
+                    self.stdout.write(f"Отправлено: {sent}, ошибок: {failed}")
+                if options["once"]:
+                    break
+                close_old_connections()
+                time.sleep(options["interval"])
+        finally:
+            transport.close()
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_remove_employee_main_employ_special_95fd95_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'available', '-popularity'], name='main_produc_categor_f32ce2_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_product_category_popularity_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='images/orders/additional/', verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0014_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='summary',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Кратко'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='url',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Ссылка'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations
+from transliterate import translit
+
+
+# Документы собираются здесь же по историческим моделям, а не через main.search:
+# миграция должна работать и после того, как код поиска и модели изменятся.
+# Дальше индекс поддерживается сигналами; перестроить: manage.py rebuild_search_index
+KIND_CODES = {'order': 0, 'employee': 1, 'application': 2, 'category': 3, 'product': 4, 'service': 5}
+KIND_FACTOR = 16
+
+INSERT_SQL = (
+    "INSERT OR REPLACE INTO main_search_index (rowid, kind, object_id, title, body, translit, url) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+def _normalize(text):
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def _documents(apps):
+    """(вид, pk, заголовок, текст, url) всех объектов, как в main.search.get_document на момент миграции"""
+    Order = apps.get_model('main', 'Order')
+    for o in Order.objects.all().iterator(chunk_size=500):
+        title = _join(o.last_name, o.name, o.middle_name) if o.last_name else o.name
+        body = _join(o.name, o.last_name, o.middle_name, o.phone, o.phone_digits, o.city, o.address, o.comment, o.work_description)
+        yield 'order', o.pk, title, body, f'/dashboard/order/{o.pk}/'
+
+    Employee = apps.get_model('main', 'Employee')
+    for e in Employee.objects.prefetch_related('specialization').iterator(chunk_size=500):
+        specializations = ', '.join(s.name for s in e.specialization.all())
+        yield ('employee', e.pk, _join(e.last_name, e.first_name, e.middle_name),
+               _join(e.phone, e.phone_digits, e.email, e.city, specializations), f'/dashboard/employee/{e.slug}/')
+
+    JobApplication = apps.get_model('main', 'JobApplication')
+    for a in JobApplication.objects.all().iterator(chunk_size=500):
+        yield ('application', a.pk, _join(a.last_name, a.first_name),
+               _join(a.phone, a.phone_digits, a.city, a.specialization, a.comment), f'/dashboard/job_application/{a.pk}/')
+
+    for kind, model_name, prefix in (
+        ('category', 'Category', 'category'), ('product', 'Product', 'product'), ('service', 'Service', 'service'),
+    ):
+        for obj in apps.get_model('main', model_name).objects.all().iterator(chunk_size=500):
+            yield kind, obj.pk, obj.name, obj.description, f'/dashboard/{prefix}/{obj.slug}/'
+
+
+def fill_index(apps, schema_editor):
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for kind, pk, title, body, url in _documents(apps):
+            title, body = title or '', body or ''
+            rows.append((
+                pk * KIND_FACTOR + KIND_CODES[kind], kind, pk, _normalize(title), _normalize(body),
+                _normalize(translit(_join(title, body), 'ru', reversed=True)), url,
+            ))
+            if len(rows) >= 500:
+                cursor.executemany(INSERT_SQL, rows)
+                rows = []
+        if rows:
+            cursor.executemany(INSERT_SQL, rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_phone_digits'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                "CREATE VIRTUAL TABLE main_search_index USING fts5("
+                "kind UNINDEXED, object_id UNINDEXED, title, body, translit, url UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ),
+            reverse_sql="DROP TABLE main_search_index",
+        ),
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
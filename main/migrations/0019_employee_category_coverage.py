@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_coverage(apps, schema_editor):
+    Employee = apps.get_model('main', 'Employee')
+    Specialization = apps.get_model('main', 'Specialization')
+    EmployeeCategory = apps.get_model('main', 'EmployeeCategory')
+
+    rows = [
+        EmployeeCategory(employee_id=employee_id, category_id=category_id, source='direct')
+        for employee_id, category_id in Employee.categories.through.objects.values_list('employee_id', 'category_id')
+    ]
+    categories_by_specialization = {}
+    for specialization_id, category_id in Specialization.categories.through.objects.values_list('specialization_id', 'category_id'):
+        categories_by_specialization.setdefault(specialization_id, []).append(category_id)
+    for employee_id, specialization_id in Employee.specialization.through.objects.values_list('employee_id', 'specialization_id'):
+        for category_id in categories_by_specialization.get(specialization_id, []):
+            rows.append(EmployeeCategory(
+                employee_id=employee_id, category_id=category_id,
+                source='specialization', specialization_id=specialization_id,
+            ))
+    EmployeeCategory.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmployeeCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('direct', 'Напрямую'), ('specialization', 'Через специализацию')], max_length=20, verbose_name='Источник')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coverage', to='main.category', verbose_name='Категория')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='coverage', to='main.employee', verbose_name='Сотрудник')),
+                ('specialization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='coverage', to='main.specialization', verbose_name='Специализация')),
+            ],
+            options={
+                'verbose_name': 'Покрытие категории',
+                'verbose_name_plural': 'Покрытие категорий',
+                'indexes': [models.Index(fields=['category', 'employee'], name='main_employ_categor_2bf14c_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('source', 'direct')), fields=('employee', 'category'), name='unique_direct_coverage'), models.UniqueConstraint(condition=models.Q(('source', 'specialization')), fields=('employee', 'category', 'specialization'), name='unique_specialization_coverage')],
+            },
+        ),
+        migrations.RunPython(fill_coverage, migrations.RunPython.noop),
+    ]
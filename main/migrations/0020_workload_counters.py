@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    # Дата выполнения у старых заказов неизвестна, поэтому "выполнено за 30 дней" начинается с нуля
+    Employee = apps.get_model('main', 'Employee')
+    Order = apps.get_model('main', 'Order')
+    rows = (
+        Order.assigned_employees.through.objects.values('employee_id')
+        .annotate(
+            open_orders=Count('order_id', filter=Q(order__status='confirmed')),
+            in_progress=Count('order_id', filter=Q(order__status='in_work')),
+        )
+        .order_by()
+    )
+    counts = {row['employee_id']: row for row in rows}
+    employees = list(Employee.objects.only('id'))
+    for employee in employees:
+        row = counts.get(employee.id, {})
+        employee.open_orders_count = row.get('open_orders', 0)
+        employee.in_progress_orders_count = row.get('in_progress', 0)
+    Employee.objects.bulk_update(employees, ['open_orders_count', 'in_progress_orders_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_employee_category_coverage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='completed_recent_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Выполнено за 30 дней'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='in_progress_orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Заказов в работе'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='open_orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Открытых заказов'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='date_completed',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Дата выполнения'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:25
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def fill_rollups(apps, schema_editor):
+    # Та же группировка, что в main.rollups.count_rollups, на исторических моделях
+    Order = apps.get_model('main', 'Order')
+    JobApplication = apps.get_model('main', 'JobApplication')
+    Employee = apps.get_model('main', 'Employee')
+    OrderDailyStat = apps.get_model('main', 'OrderDailyStat')
+    ApplicationDailyStat = apps.get_model('main', 'ApplicationDailyStat')
+    CityMasterStat = apps.get_model('main', 'CityMasterStat')
+
+    orders = (
+        Order.objects.annotate(day=TruncDate('date_created')).values('day', 'status')
+        .annotate(n=Count('id')).values_list('day', 'status', 'n').order_by()
+    )
+    OrderDailyStat.objects.bulk_create(
+        [OrderDailyStat(day=day, status=status, count=n) for day, status, n in orders], batch_size=500
+    )
+    applications = (
+        JobApplication.objects.annotate(day=TruncDate('date_created')).values('day', 'specialization')
+        .annotate(n=Count('id')).values_list('day', 'specialization', 'n').order_by()
+    )
+    ApplicationDailyStat.objects.bulk_create(
+        [ApplicationDailyStat(day=day, specialization=specialization, count=n) for day, specialization, n in applications],
+        batch_size=500,
+    )
+    cities = Counter(
+        ' '.join(city.lower().replace('ё', 'е').split())
+        for city in Employee.objects.filter(available=True, status__in=('active', 'part_time')).values_list('city', flat=True)
+    )
+    CityMasterStat.objects.bulk_create([CityMasterStat(city=city, count=n) for city, n in cities.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_workload_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityMasterStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100, unique=True, verbose_name='Город')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Мастеров')),
+            ],
+            options={
+                'verbose_name': 'Мастера в городе',
+                'verbose_name_plural': 'Мастера по городам',
+            },
+        ),
+        migrations.CreateModel(
+            name='ApplicationDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('specialization', models.CharField(max_length=100, verbose_name='Специализация')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Анкет')),
+            ],
+            options={
+                'verbose_name': 'Анкеты за день',
+                'verbose_name_plural': 'Анкеты по дням',
+                'constraints': [models.UniqueConstraint(fields=('day', 'specialization'), name='unique_application_daily_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('status', models.CharField(choices=[('new', 'Новый'), ('confirmed', 'Подтвержден'), ('canceled', 'Отменен'), ('in_work', 'В работе'), ('completed', 'Выполнен'), ('spam', 'Спам'), ('failed', 'Не удалось связаться'), ('callback', 'Перезвонить')], max_length=20, verbose_name='Статус')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Заказов')),
+            ],
+            options={
+                'verbose_name': 'Заказы за день',
+                'verbose_name_plural': 'Заказы по дням',
+                'constraints': [models.UniqueConstraint(fields=('day', 'status'), name='unique_order_daily_stat')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_dashboard_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_ids', models.JSONField(verbose_name='Сотрудники')),
+                ('date_created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Изменение мастеров',
+                'verbose_name_plural': 'Изменения мастеров',
+            },
+        ),
+    ]
@@ -1,26 +1,238 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 # from django.core.validators import MinValueValidator, MaxValueValidator
 
 # from django.contrib.auth.models import User
 
+from functools import lru_cache
+from os.path import commonprefix
+
 from phonenumber_field.modelfields import PhoneNumberField
 from transliterate import translit
+from transliterate.exceptions import LanguageCodeError, LanguagePackNotFound
+
+
+SLUG_CACHE_SIZE = 4096
+
+# Русские буквы -> латиница ровно так же, как translit(..., "ru", reversed=True), но одним str.translate.
+# Таблица строится из самого языкового пакета, поэтому не расходится с ним
+RU_TRANSLIT_TABLE = str.maketrans({
+    letter: translit(letter, "ru", reversed=True)
+    for letter in [chr(code) for code in range(ord("А"), ord("я") + 1)] + ["ё", "Ё"]
+})
 
 
+@lru_cache(maxsize=SLUG_CACHE_SIZE)
 def create_slug(text):
-    """Создает slug с поддержкой кириллицы"""
-    try:
-        # Транслитерация кириллицы в латиницу
-        transliterated = translit(text, "ru", reversed=True)
-        return slugify(transliterated)
-    except:
-        # Если транслитерация не удалась, используем стандартный slugify
-        return slugify(text, allow_unicode=True)
+    """Создает slug с поддержкой кириллицы. Названия повторяются, поэтому результаты запоминаются"""
+    transliterated = text.translate(RU_TRANSLIT_TABLE)
+    if not transliterated.isascii():
+        # Кроме русских букв есть другие - нужна полная транслитерация
+        try:
+            transliterated = translit(text, "ru", reversed=True)
+        except (LanguageCodeError, LanguagePackNotFound):
+            # Если транслитерация не удалась, используем стандартный slugify
+            return slugify(text, allow_unicode=True)
+    return slugify(transliterated)
+
+
+SLUG_SAVE_ATTEMPTS = 5
+SLUG_SUFFIX_RESERVE = 10  # на столько обрезается база в "foo-N" с номером до девяти цифр
+
+
+def _numbered_slug(base, number, max_length):
+    """"foo" для number=0, иначе "foo-N"; база обрезается, чтобы slug уместился в max_length"""
+    if not number:
+        return base
+    suffix = f"-{number}"
+    return base[:max_length - len(suffix)] + suffix
+
+
+def slug_has_base(slug, base, max_length):
+    """Выдан ли slug для базы base: "foo" или "foo-N" (с обрезанной базой)"""
+    if slug == base[:max_length]:
+        return True
+    _, _, number = slug.rpartition("-")
+    return number.isdigit() and _numbered_slug(base[:max_length], int(number), max_length) == slug
+
+
+def allocate_slugs(model, bases, exclude_pk=None, field="slug"):
+    """Уникальные slug для списка базовых: "foo", затем первый свободный "foo-N".
+
+    Занятые slug выбираются одним запросом по общему началу всех баз (startswith),
+    свободный номер ищется в памяти. Повторы баз внутри списка тоже получают разные slug,
+    так что результат годится для bulk_create.
+    """
+    max_length = model._meta.get_field(field).max_length
+    bases = [base[:max_length] for base in bases]
+    if not bases:
+        return []
+    # Длинная база в "foo-N" обрезается, поэтому от общего начала оставляем запас под суффикс
+    prefix = commonprefix(bases)[:max_length - SLUG_SUFFIX_RESERVE]
+    queryset = model._default_manager.filter(**{f"{field}__startswith": prefix}).order_by()
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    used = set(queryset.values_list(field, flat=True))
+
+    # Номера выдаются по возрастанию, поэтому поиск свободного продолжается с последнего выданного
+    next_number = {}
+    slugs = []
+    for base in bases:
+        number = next_number.get(base, 0)
+        while _numbered_slug(base, number, max_length) in used:
+            number += 1
+        slug = _numbered_slug(base, number, max_length)
+        used.add(slug)
+        next_number[base] = number + 1
+        slugs.append(slug)
+    return slugs
+
+
+def save_with_unique_slug(instance, base, save, *args, **kwargs):
+    """Выдает instance.slug по base и сохраняет объект функцией save.
+
+    Если между выбором slug и записью его занял параллельный запрос,
+    slug выбирается заново внутри точки сохранения.
+    """
+    model = type(instance)
+    for attempt in range(SLUG_SAVE_ATTEMPTS):
+        instance.slug = allocate_slugs(model, [base], exclude_pk=instance.pk)[0]
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            slug_taken = model._default_manager.filter(slug=instance.slug).exclude(pk=instance.pk).exists()
+            if not slug_taken or attempt == SLUG_SAVE_ATTEMPTS - 1:
+                raise
+
+
+def phone_digits(phone):
+    """Только цифры номера: +7 (912) 345-67-89 -> 79123456789"""
+    return "".join(ch for ch in str(phone or "") if ch.isdigit())
+
+
+def phone_search_q(query, field="phone_digits"):
+    """Условие поиска по части номера так, как его набирают сотрудники.
+
+    "8 912 34" и "+7 912 34" ищутся как начало номера, "912-34" - как начало номера
+    без кода страны, "4567" - еще и как окончание. Все варианты - диапазоны по индексу.
+    """
+    digits = phone_digits(query)
+    if not digits:
+        return models.Q(pk__in=[])
+    # Ведущая 8 - междугородний префикс только для начала номера; окончание ищется по цифрам как есть
+    prefix = "7" + digits[1:] if digits.startswith("8") and len(digits) > 1 else digits
+
+    def starts_with(column, prefix):
+        # ':' следует за '9' в ASCII, поэтому диапазон [prefix, prefix + ':') - все номера с этим началом
+        return models.Q(**{f"{column}__gte": prefix, f"{column}__lt": prefix + ":"})
+
+    condition = starts_with(field, prefix) | starts_with(f"{field}_reversed", digits[::-1])
+    if not prefix.startswith("7"):
+        condition |= starts_with(field, "7" + prefix)
+    return condition
+
+
+class DirtyFieldsMixin:
+    """Запоминает значения полей при загрузке из базы и после сохранения.
+
+    has_changed() сравнивает с ними без запроса к базе, а save() уже
+    сохраненного объекта без явного update_fields пишет только измененные поля,
+    а если изменений нет - ничего не пишет и сигналы не отправляет.
+    Миксин указывается перед models.Model, чтобы save() модели успел
+    заполнить вычисляемые поля (slug и т.п.) до сравнения.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _snapshot(self, attnames=None):
+        loaded = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__ and (attnames is None or field.attname in attnames)
+        }
+        if attnames is None:
+            self._loaded_values = loaded
+        else:
+            self._loaded_values = {**getattr(self, "_loaded_values", {}), **loaded}
+
+    def get_loaded_values(self):
+        """Значения полей на момент загрузки или последнего сохранения; None - объект не из базы"""
+        return getattr(self, "_loaded_values", None)
+
+    def get_dirty_fields(self):
+        """Имена полей, измененных с момента загрузки; None - сравнивать не с чем"""
+        loaded = self.get_loaded_values()
+        if loaded is None:
+            return None
+        return {
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.attname in self.__dict__
+            # Отложенное (defer/only) поле, которому присвоили значение, тоже считается измененным
+            and (field.attname not in loaded or loaded[field.attname] != getattr(self, field.attname))
+        }
+
+    def has_changed(self, *fields):
+        """Изменилось ли хотя бы одно из полей; для нового объекта - всегда да"""
+        dirty = self.get_dirty_fields()
+        return dirty is None or any(field in dirty for field in fields)
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            dirty = self.get_dirty_fields()
+            if dirty is not None and not dirty:
+                # Ничего не изменилось: полный UPDATE затер бы значения, которые меняются
+                # в обход save() (счетчики загрузки мастера через F())
+                return
+            if dirty:
+                # auto_now-поля (дата обновления) обновляются при каждом сохранении
+                auto_now = {
+                    field.name for field in self._meta.concrete_fields if getattr(field, "auto_now", False)
+                }
+                kwargs["update_fields"] = dirty | auto_now
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        self._snapshot(
+            None if update_fields is None else {self._meta.get_field(name).attname for name in update_fields}
+        )
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot(None if fields is None else {self._meta.get_field(name).attname for name in fields})
+
+
+class PhoneDigitsModel(models.Model):
+    """Хранит номер телефона в виде цифр (прямо и задом наперед) для поиска по индексу"""
+
+    phone_digits = models.CharField(max_length=20, blank=True, db_index=True, editable=False, verbose_name="Телефон (цифры)")
+    phone_digits_reversed = models.CharField(max_length=20, blank=True, db_index=True, editable=False, verbose_name="Телефон (цифры в обратном порядке)")
 
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.phone_digits = phone_digits(self.phone)
+        self.phone_digits_reversed = self.phone_digits[::-1]
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "phone_digits", "phone_digits_reversed"}
+        super().save(*args, **kwargs)
 
-class Category(models.Model):
+
+class Category(DirtyFieldsMixin, models.Model):
     name = models.CharField(max_length=100, db_index=True, verbose_name="Категория")  # название категории
     slug = models.SlugField(max_length=100, unique=True, verbose_name="url")  # человекочитаемый URL
     image = models.ImageField(upload_to="images/category/", verbose_name="Изображение")
@@ -37,32 +249,26 @@ class Category(models.Model):
 
     def save(self, *args, **kwargs):
         # Генерируем slug если он пустой или имя изменилось
-        if not self.slug or self._name_changed():
-            self.slug = create_slug(self.name)
-
-            # Проверяем уникальность slug
-            original_slug = self.slug
-            counter = 1
-            while (
-                self.__class__.objects.filter(slug=self.slug)
-                .exclude(pk=self.pk)
-                .exists()
-            ):
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
-
-        super().save(*args, **kwargs)
-
-    def _name_changed(self):
-        """Проверяет, изменилось ли имя категории"""
-        if not self.pk:  # Новый объект - считаем что имя "изменилось"
-            return True
-
-        try:
-            old_obj = self.__class__.objects.get(pk=self.pk)
-            return old_obj.name != self.name
-        except self.__class__.DoesNotExist:
-            return True
+        if not self.slug or self.has_changed("name"):
+            save_with_unique_slug(self, create_slug(self.name), super().save, *args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+
+    def set_specializations(self, specializations):
+        """Приводит специализации категории к списку specializations.
+
+        Разница с текущими связями считается по таблице связей, затем
+        применяется одним INSERT и одним DELETE. m2m_changed при этом
+        отправляется, так что покрытие мастеров и индексы обновятся как обычно.
+        """
+        current = set(
+            Specialization.categories.through.objects.filter(category_id=self.pk).values_list("specialization_id", flat=True)
+        )
+        wanted = {specialization.pk for specialization in specializations}
+        if current - wanted:
+            self.specialization_set.remove(*(current - wanted))
+        if wanted - current:
+            self.specialization_set.add(*(wanted - current))
 
     def __str__(self):
         return str(self.name)
@@ -71,7 +277,7 @@ class Category(models.Model):
         return reverse("main:product_list", args=[self.slug])
 
 
-class Product(models.Model):
+class Product(DirtyFieldsMixin, models.Model):
     category = models.ForeignKey(Category,related_name="products",on_delete=models.CASCADE,verbose_name="Категория",)  # связь с категорией
     name = models.CharField(max_length=100, db_index=True, verbose_name="Продукт")  # название товара
     slug = models.SlugField(max_length=100, unique=True, verbose_name="url")  # человекочитаемый URL
@@ -90,36 +296,15 @@ class Product(models.Model):
 
         indexes = [
             models.Index(fields=["available", "name"]),
+            models.Index(fields=["category", "available", "-popularity"]),
         ]
 
     def save(self, *args, **kwargs):
         # Генерируем slug если он пустой или имя изменилось
-        if not self.slug or self._name_changed():
-            self.slug = create_slug(self.name)
-
-            # Проверяем уникальность slug
-            original_slug = self.slug
-            counter = 1
-            while (
-                self.__class__.objects.filter(slug=self.slug)
-                .exclude(pk=self.pk)
-                .exists()
-            ):
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
-
-        super().save(*args, **kwargs)
-
-    def _name_changed(self):
-        """Проверяет, изменилось ли имя категории"""
-        if not self.pk:  # Новый объект - считаем что имя "изменилось"
-            return True
-
-        try:
-            old_obj = self.__class__.objects.get(pk=self.pk)
-            return old_obj.name != self.name
-        except self.__class__.DoesNotExist:
-            return True
+        if not self.slug or self.has_changed("name"):
+            save_with_unique_slug(self, create_slug(self.name), super().save, *args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return str(self.name)
@@ -128,7 +313,7 @@ class Product(models.Model):
         return reverse("main:product_detail", args=[self.category.slug, self.slug])
 
 
-class Service(models.Model):
+class Service(DirtyFieldsMixin, models.Model):
     product = models.ForeignKey(Product, related_name="services", on_delete=models.CASCADE, verbose_name="Товар")  # связь с товаром
     name = models.CharField(max_length=100, db_index=True, verbose_name="Услуга")  # название услуги
     slug = models.SlugField(max_length=100, unique=True, verbose_name="url")  # человекочитаемый URL
@@ -150,32 +335,10 @@ class Service(models.Model):
 
     def save(self, *args, **kwargs):
         # Генерируем slug если он пустой или имя изменилось
-        if not self.slug or self._name_changed():
-            self.slug = create_slug(self.name)
-
-            # Проверяем уникальность slug
-            original_slug = self.slug
-            counter = 1
-            while (
-                self.__class__.objects.filter(slug=self.slug)
-                .exclude(pk=self.pk)
-                .exists()
-            ):
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
-
-        super().save(*args, **kwargs)
-
-    def _name_changed(self):
-        """Проверяет, изменилось ли имя категории"""
-        if not self.pk:  # Новый объект - считаем что имя "изменилось"
-            return True
-
-        try:
-            old_obj = self.__class__.objects.get(pk=self.pk)
-            return old_obj.name != self.name
-        except self.__class__.DoesNotExist:
-            return True
+        if not self.slug or self.has_changed("name"):
+            save_with_unique_slug(self, create_slug(self.name), super().save, *args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return str(self.name)
@@ -194,7 +357,7 @@ class Specialization(models.Model):
         return str(self.name)
 
 
-class Employee(models.Model):
+class Employee(DirtyFieldsMixin, PhoneDigitsModel):
     STATUS_CHOICES = [
         ('trainee', 'Стажировка'),
         ('active', 'Основной состав'),
@@ -226,6 +389,11 @@ class Employee(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active', verbose_name="Статус")
     slug = models.SlugField(max_length=100, unique=True, verbose_name="url", blank=True)
     available = models.BooleanField(default=True, verbose_name="Доступность")
+
+    # Счетчики загрузки, поддерживаются сигналами (main/workload.py). Сверка: manage.py recount_workload
+    open_orders_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Открытых заказов")
+    in_progress_orders_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Заказов в работе")
+    completed_recent_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Выполнено за 30 дней")
     
     class Meta:
         verbose_name = "Сотрудник"
@@ -236,36 +404,19 @@ class Employee(models.Model):
         ]
         
     def save(self, *args, **kwargs):
-        if not self.slug or self._name_changed():
-            self.slug = create_slug(f"{self.first_name}-{self.last_name}")
-
-            original_slug = self.slug
-            counter = 1
-            while (
-                self.__class__.objects.filter(slug=self.slug)
-                .exclude(pk=self.pk)
-                .exists()
-            ):
-                self.slug = f"{original_slug}-{counter}"
-                counter += 1
-
-        super().save(*args, **kwargs)
-
-    def _name_changed(self):
-        """Проверяет, изменилось ли имя категории"""
-        if not self.pk:  # Новый объект - считаем что имя "изменилось"
-            return True
-
-        try:
-            old_obj = self.__class__.objects.get(pk=self.pk)
-            return (old_obj.first_name != self.first_name or 
-                    old_obj.last_name != self.last_name)
-        except self.__class__.DoesNotExist:
-            return True
+        if not self.slug or self.has_changed("first_name", "last_name"):
+            save_with_unique_slug(self, create_slug(f"{self.first_name}-{self.last_name}"), super().save, *args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse("main:employee_detail", args=[self.slug])
 
+    @property
+    def current_workload(self):
+        """Сколько незавершенных заказов сейчас на мастере"""
+        return self.open_orders_count + self.in_progress_orders_count
+
     def get_experience_display(self):
         """Возвращает опыт работы с правильным склонением"""
         exp = self.experience
@@ -286,8 +437,49 @@ class Employee(models.Model):
         return f"{self.first_name} {self.last_name} специализация: {self.specialization} ({self.phone})"
 
 
+class EmployeeCategory(models.Model):
+    """Какие категории покрывает сотрудник: напрямую или через специализацию.
+
+    Денормализация связей Employee.categories и Employee.specialization -> Specialization.categories,
+    поддерживается сигналами m2m_changed (main/coverage.py). Проверка: manage.py rebuild_coverage --check
+    """
+
+    SOURCE_CHOICES = [
+        ("direct", "Напрямую"),
+        ("specialization", "Через специализацию"),
+    ]
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="coverage", verbose_name="Сотрудник")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="coverage", verbose_name="Категория")
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, verbose_name="Источник")
+    specialization = models.ForeignKey(Specialization, on_delete=models.CASCADE, null=True, blank=True, related_name="coverage", verbose_name="Специализация")  # только для source="specialization"
+
+    class Meta:
+        verbose_name = "Покрытие категории"
+        verbose_name_plural = "Покрытие категорий"
+
+        indexes = [
+            models.Index(fields=["category", "employee"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["employee", "category"],
+                condition=models.Q(source="direct"),
+                name="unique_direct_coverage",
+            ),
+            models.UniqueConstraint(
+                fields=["employee", "category", "specialization"],
+                condition=models.Q(source="specialization"),
+                name="unique_specialization_coverage",
+            ),
+        ]
 
-class Order(models.Model):
+    def __str__(self):
+        return f"{self.employee_id} -> {self.category_id} ({self.get_source_display()})"
+
+
+
+class Order(DirtyFieldsMixin, PhoneDigitsModel):
     STATUS_CHOICES = [
         ("new", "Новый"),
         ("confirmed", "Подтвержден"),
@@ -317,6 +509,23 @@ class Order(models.Model):
     categories = models.ManyToManyField('Category', blank=True, verbose_name="Категории")
     products = models.ManyToManyField('Product', blank=True, verbose_name="Товары")
     assigned_employees = models.ManyToManyField('Employee', blank=True, verbose_name="Назначенные мастера")
+    date_completed = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Дата выполнения")
+
+    def save(self, *args, **kwargs):
+        # Дата выполнения нужна для счетчика "выполнено за 30 дней". Ставится только при переходе
+        # в "выполнен": у заказов, выполненных до появления поля, она остается пустой
+        if (
+            self.status == "completed"
+            and not self.date_completed
+            and (self._state.adding or self.has_changed("status"))
+        ):
+            self.date_completed = timezone.now()
+        elif self.status != "completed":
+            self.date_completed = None
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "status" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "date_completed"}
+        super().save(*args, **kwargs)
 
     def get_display_name(self):
         """Возвращает полное имя если есть, иначе обычное имя"""
@@ -340,12 +549,16 @@ class Order(models.Model):
 
         indexes = [
             models.Index(fields=["status", "phone", "date_created"]),
+            # Постраничный вывод списка заказов по ключу (date_created, id), в том числе с фильтром по статусу
+            models.Index(fields=["-date_created", "-id"]),
+            models.Index(fields=["status", "-date_created", "-id"]),
         ]
 
 
 class OrderImage(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='additional_images_set', verbose_name="Заказ")
     image = models.ImageField(upload_to="images/orders/additional/", verbose_name="Изображение")
+    thumbnail = models.ImageField(upload_to="images/orders/additional/", blank=True, verbose_name="Миниатюра")  # заполняется после фоновой обработки
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата загрузки")
     
     class Meta:
@@ -356,7 +569,7 @@ class OrderImage(models.Model):
         return f"Изображение для заказа #{self.order.id}"
 
 
-class JobApplication(models.Model):
+class JobApplication(DirtyFieldsMixin, PhoneDigitsModel):
     STATUS_CHOICES = [
         ("new", "Новый"),
         ("invited", "Приглашен"),
@@ -404,6 +617,113 @@ class JobApplication(models.Model):
         ]
 
 
+class OrderDailyStat(models.Model):
+    """Сколько заказов, созданных в этот день, сейчас находятся в каждом статусе.
+
+    Сводка для панели управления, поддерживается сигналами и массовой сменой статуса
+    (main/rollups.py). Проверка: manage.py rebuild_rollups --check
+    """
+
+    day = models.DateField(verbose_name="День")
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, verbose_name="Статус")
+    count = models.PositiveIntegerField(default=0, verbose_name="Заказов")
+
+    class Meta:
+        verbose_name = "Заказы за день"
+        verbose_name_plural = "Заказы по дням"
+
+        constraints = [
+            models.UniqueConstraint(fields=["day", "status"], name="unique_order_daily_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.get_status_display()} - {self.count}"
+
+
+class ApplicationDailyStat(models.Model):
+    """Сколько анкет на каждую специализацию пришло за день (сводка для панели управления)"""
+
+    day = models.DateField(verbose_name="День")
+    specialization = models.CharField(max_length=100, verbose_name="Специализация")
+    count = models.PositiveIntegerField(default=0, verbose_name="Анкет")
+
+    class Meta:
+        verbose_name = "Анкеты за день"
+        verbose_name_plural = "Анкеты по дням"
+
+        constraints = [
+            models.UniqueConstraint(fields=["day", "specialization"], name="unique_application_daily_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.specialization} - {self.count}"
+
+
+class CityMasterStat(models.Model):
+    """Сколько в городе мастеров, доступных для подбора (сводка для панели управления)"""
+
+    city = models.CharField(max_length=100, unique=True, verbose_name="Город")  # как в normalize_city
+    count = models.PositiveIntegerField(default=0, verbose_name="Мастеров")
+
+    class Meta:
+        verbose_name = "Мастера в городе"
+        verbose_name_plural = "Мастера по городам"
+
+    def __str__(self):
+        return f"{self.city} - {self.count}"
+
+
+class Notification(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Ожидает отправки"),
+        ("sending", "Отправляется"),
+        ("sent", "Отправлено"),
+        ("failed", "Ошибка"),
+    ]
+
+    chat_id = models.CharField(max_length=100, verbose_name="Чат")
+    text = models.TextField(verbose_name="Текст")
+    parse_mode = models.CharField(max_length=20, default="Markdown", blank=True, verbose_name="Разметка")
+    summary = models.CharField(max_length=200, blank=True, verbose_name="Кратко")  # строка для сводки при всплеске заявок
+    url = models.CharField(max_length=200, blank=True, verbose_name="Ссылка")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    date_created = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    date_sent = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    class Meta:
+        verbose_name = "Уведомление"
+        verbose_name_plural = "Уведомления"
+        ordering = ["next_attempt_at", "id"]
+
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"Уведомление #{self.pk} ({self.get_status_display()})"
+
+
+class MasterChange(models.Model):
+    """Запись ленты изменений мастеров для индекса рекомендаций (main/recommendations.py).
+
+    id - версия ленты: автоинкремент выдает номера атомарно, поэтому параллельные
+    процессы не перезаписывают изменения друг друга. Старые записи удаляются (main/cache.py)
+    """
+
+    employee_ids = models.JSONField(verbose_name="Сотрудники")  # ["*"] - перечитать всех
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Дата создания")
+
+    class Meta:
+        verbose_name = "Изменение мастеров"
+        verbose_name_plural = "Изменения мастеров"
+
+    def __str__(self):
+        return f"#{self.pk}: {self.employee_ids}"
+
+
 # class Review(models.Model):
 #     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь', null=True, blank=True)
 #     name = models.CharField(max_length=100, verbose_name='Имя', blank=True)  # оставляем для совместимости
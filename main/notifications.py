@@ -0,0 +1,156 @@
+import logging
+import os
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from dotenv import load_dotenv
+from telegram.helpers import escape_markdown
+
+from .models import Notification
+from .tg_bot import TelegramSender
+
+
+load_dotenv()
+TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
+TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 8)
+RETRY_BASE_DELAY = getattr(settings, 'NOTIFICATION_RETRY_BASE_DELAY', 30)
+RETRY_MAX_DELAY = getattr(settings, 'NOTIFICATION_RETRY_MAX_DELAY', 60 * 60)
+# С какого числа ожидающих уведомлений в один чат они объединяются в одну сводку
+DIGEST_THRESHOLD = getattr(settings, 'NOTIFICATION_DIGEST_THRESHOLD', 3)
+
+
+class TelegramTransport:
+    """Отправка уведомлений в Telegram через один долгоживущий клиент с учетом лимитов"""
+
+    def __init__(self, token=None):
+        self.sender = TelegramSender(token or TELEGRAM_TOKEN)
+
+    def send(self, chat_id, text, parse_mode='Markdown'):
+        self.sender.send(chat_id, text, parse_mode or None)
+
+    def close(self):
+        self.sender.close()
+
+
+class LocmemTransport:
+    """Складывает уведомления в список вместо отправки - для тестов и локальной разработки"""
+
+    outbox = []
+
+    def send(self, chat_id, text, parse_mode='Markdown'):
+        self.outbox.append({'chat_id': chat_id, 'text': text, 'parse_mode': parse_mode})
+
+    def close(self):
+        pass
+
+
+def get_transport():
+    return import_string(getattr(settings, 'NOTIFICATION_TRANSPORT', 'main.notifications.TelegramTransport'))()
+
+
+def enqueue(text, chat_id=None, parse_mode='Markdown', summary='', url=''):
+    """Кладет уведомление в очередь. Вызывается внутри транзакции, которая создает объект"""
+    return Notification.objects.create(
+        chat_id=chat_id or TELEGRAM_CHAT_ID or '',
+        text=text,
+        parse_mode=parse_mode,
+        summary=summary,
+        url=url,
+    )
+
+
+def build_digest(notifications):
+    """Одно сообщение вместо нескольких: "5 новых заявок за 3 мин." и список ссылок"""
+    minutes = max(1, round((timezone.now() - min(n.date_created for n in notifications)).total_seconds() / 60))
+    lines = [f'*Новых заявок: {len(notifications)} за последние {minutes} мин.*', '']
+    for notification in notifications:
+        # summary - имя и телефон из формы на сайте: один символ разметки в нем ломает всю сводку.
+        # Текст уведомления уже в разметке Markdown, поэтому его не экранируем
+        if notification.summary:
+            summary = escape_markdown(notification.summary, version=1)
+        else:
+            summary = notification.text.strip().splitlines()[0]
+        lines.append(f'• {summary} — [открыть]({notification.url})' if notification.url else f'• {summary}')
+    return '\n'.join(lines)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка между попытками: 30с, 1м, 2м ... но не больше часа"""
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def _retry_after(error):
+    """Пауза, которую просит Telegram при превышении лимитов (RetryAfter)"""
+    retry_after = getattr(error, 'retry_after', None)
+    if isinstance(retry_after, timedelta):
+        return retry_after
+    if retry_after:
+        return timedelta(seconds=retry_after)
+    return None
+
+
+def _claim(notifications):
+    """Захватывает записи, чтобы параллельный обработчик не отправил их второй раз"""
+    claimed = []
+    for notification in notifications:
+        if Notification.objects.filter(pk=notification.pk, status='pending').update(status='sending'):
+            notification.attempts += 1
+            claimed.append(notification)
+    return claimed
+
+
+def _finish(notifications, error=None):
+    now = timezone.now()
+    for notification in notifications:
+        if error is None:
+            notification.status = 'sent'
+            notification.date_sent = now
+            notification.last_error = ''
+        else:
+            notification.last_error = str(error)
+            if notification.attempts >= MAX_ATTEMPTS:
+                notification.status = 'failed'
+            else:
+                notification.status = 'pending'
+                notification.next_attempt_at = now + (_retry_after(error) or retry_delay(notification.attempts))
+        notification.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'date_sent'])
+
+
+def deliver_pending(transport=None, limit=100):
+    """Отправляет накопившиеся уведомления, возвращает (отправлено, с ошибкой).
+
+    Если в один чат ждут отправки DIGEST_THRESHOLD и больше уведомлений,
+    они уходят одной сводкой вместо отдельных сообщений.
+    """
+    transport = transport or get_transport()
+    pending = Notification.objects.filter(status='pending', next_attempt_at__lte=timezone.now())[:limit]
+    by_chat = defaultdict(list)
+    for notification in pending:
+        by_chat[notification.chat_id].append(notification)
+
+    sent = failed = 0
+    for chat_id, notifications in by_chat.items():
+        notifications = _claim(notifications)
+        if len(notifications) >= DIGEST_THRESHOLD:
+            batches = [(notifications, build_digest(notifications), 'Markdown')]
+        else:
+            batches = [([n], n.text, n.parse_mode) for n in notifications]
+
+        for batch, text, parse_mode in batches:
+            try:
+                transport.send(chat_id, text, parse_mode)
+            except Exception as e:
+                failed += len(batch)
+                logger.warning(f'Уведомления {[n.pk for n in batch]} не отправлены: {e}')
+                _finish(batch, e)
+            else:
+                sent += len(batch)
+                _finish(batch)
+    return sent, failed
@@ -0,0 +1,89 @@
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityBuffer:
+    """Буфер счетчиков популярности в памяти процесса.
+
+    Просмотры и попадания в заказы копятся в памяти и раз в интервал
+    записываются в базу пакетными UPDATE ... SET popularity = popularity + n.
+    При перезапуске воркера теряется не больше одного интервала счетчиков.
+    Число разных объектов в буфере ограничено max_keys: обращения к новым
+    объектам сверх лимита до следующей записи не учитываются.
+    """
+
+    def __init__(self, interval, max_keys=10000):
+        self.interval = interval
+        self.max_keys = max_keys
+        self.dropped = 0
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, model, field, value, n=1):
+        """Учитывает n обращений к объекту model, найденному по field=value"""
+        key = (model, field, value)
+        with self._lock:
+            if key not in self._counts and len(self._counts) >= self.max_keys:
+                self.dropped += n
+                return
+            self._counts[key] += n
+            if self._thread is None:
+                self._start()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name="popularity-flush", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при записи счетчиков популярности: {e}")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Записывает накопленные счетчики в базу, возвращает число обновленных строк"""
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logger.warning(f"Буфер популярности переполнен, не учтено обращений: {dropped}")
+        if not counts:
+            return 0
+
+        # Группируем по (модель, поле, приращение), чтобы обойтись минимумом UPDATE
+        batches = defaultdict(list)
+        for (model, field, value), n in counts.items():
+            batches[(model, field, n)].append(value)
+
+        updated = 0
+        try:
+            with transaction.atomic():
+                for (model, field, n), values in batches.items():
+                    updated += model.objects.filter(**{f"{field}__in": values}).update(
+                        popularity=F("popularity") + n
+                    )
+        except Exception:
+            # Возвращаем счетчики в буфер, чтобы не потерять их
+            with self._lock:
+                self._counts.update(counts)
+            raise
+        return updated
+
+
+popularity_buffer = PopularityBuffer(
+    getattr(settings, "POPULARITY_FLUSH_INTERVAL", 60),
+    getattr(settings, "POPULARITY_BUFFER_MAX_KEYS", 10000),
+)
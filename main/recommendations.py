@@ -0,0 +1,176 @@
+import heapq
+import threading
+from collections import defaultdict, namedtuple
+
+from .cache import get_masters_version, get_master_changes
+from .models import Employee, EmployeeCategory
+
+
+# Кого можно назначать на заказ и насколько охотно: основной состав, затем частичная занятость
+STATUS_WEIGHTS = {'active': 1.0, 'part_time': 0.5}
+
+# Веса составляющих оценки
+CATEGORY_WEIGHT = 4.0
+PRODUCT_WEIGHT = 2.0
+SERVICE_WEIGHT = 1.0
+CITY_WEIGHT = 1.5
+EXPERIENCE_WEIGHT = 1.0
+STATUS_WEIGHT = 1.0
+WORKLOAD_WEIGHT = 2.0
+EXPERIENCE_CAP = 10  # опыт больше 10 лет уже не дает преимущества
+
+Recommendation = namedtuple('Recommendation', 'employee_id name score open_orders city_match')
+
+
+def normalize_city(city):
+    return ' '.join(str(city or '').lower().replace('ё', 'е').split())
+
+
+class MasterProfile:
+    """Все, что нужно для оценки мастера, без обращения к базе"""
+
+    __slots__ = ('id', 'name', 'city', 'experience', 'status', 'categories', 'products', 'service_products', 'open_orders')
+
+    def __init__(self, id, name, city, experience, status, categories=(), products=(), service_products=(), open_orders=0):
+        self.id = id
+        self.name = name
+        self.city = normalize_city(city)
+        self.experience = experience
+        self.status = status
+        self.categories = set(categories)
+        self.products = set(products)
+        self.service_products = set(service_products)  # товары, по которым мастер оказывает услуги
+        self.open_orders = open_orders
+
+
+def score(profile, categories, products, city):
+    """Оценка мастера для заказа с категориями, товарами и адресом city. Возвращает (оценка, совпал ли город)"""
+    total = STATUS_WEIGHT * STATUS_WEIGHTS.get(profile.status, 0)
+    if categories:
+        total += CATEGORY_WEIGHT * len(categories & profile.categories) / len(categories)
+    if products:
+        total += PRODUCT_WEIGHT * len(products & profile.products) / len(products)
+        total += SERVICE_WEIGHT * len(products & profile.service_products) / len(products)
+    # В заказе город часто записан вместе с адресом: "Москва, ул. Ленина 1"
+    city_match = bool(city and profile.city and profile.city in city)
+    if city_match:
+        total += CITY_WEIGHT
+    total += EXPERIENCE_WEIGHT * min(profile.experience, EXPERIENCE_CAP) / EXPERIENCE_CAP
+    total += WORKLOAD_WEIGHT / (1 + profile.open_orders)
+    return total, city_match
+
+
+class MasterIndex:
+    """Индекс мастеров в памяти процесса для подбора исполнителей на заказ.
+
+    Профили и обратные индексы категория/товар -> мастера строятся один раз,
+    затем перед каждым запросом подгружаются только мастера из ленты изменений
+    (main.cache.record_master_changes), которую пополняют сигналы.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.profiles = {}
+        self.by_category = defaultdict(set)
+        self.by_product = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        self.remove(profile.id)
+        self.profiles[profile.id] = profile
+        for category_id in profile.categories:
+            self.by_category[category_id].add(profile.id)
+        for product_id in profile.products | profile.service_products:
+            self.by_product[product_id].add(profile.id)
+
+    def remove(self, employee_id):
+        profile = self.profiles.pop(employee_id, None)
+        if profile is None:
+            return
+        for category_id in profile.categories:
+            self.by_category[category_id].discard(employee_id)
+        for product_id in profile.products | profile.service_products:
+            self.by_product[product_id].discard(employee_id)
+
+    def load(self, employee_ids=None):
+        """Загружает профили из базы: всех мастеров или только указанных. Четыре запроса независимо от числа мастеров"""
+        def only_changed(queryset, field='employee_id'):
+            return queryset if employee_ids is None else queryset.filter(**{f'{field}__in': employee_ids})
+
+        employees = only_changed(
+            Employee.objects.filter(available=True, status__in=STATUS_WEIGHTS), field='pk'
+        ).values_list(
+            'id', 'first_name', 'last_name', 'city', 'experience', 'status', 'open_orders_count', 'in_progress_orders_count'
+        )
+
+        categories = defaultdict(list)
+        for employee_id, category_id in only_changed(EmployeeCategory.objects.all()).values_list('employee_id', 'category_id'):
+            categories[employee_id].append(category_id)
+        products = defaultdict(list)
+        for employee_id, product_id in only_changed(Employee.products.through.objects.all()).values_list('employee_id', 'product_id'):
+            products[employee_id].append(product_id)
+        service_products = defaultdict(list)
+        for employee_id, product_id in only_changed(Employee.services.through.objects.all()).values_list('employee_id', 'service__product_id'):
+            service_products[employee_id].append(product_id)
+
+        if employee_ids is None:
+            self.profiles.clear()
+            self.by_category.clear()
+            self.by_product.clear()
+        else:
+            # Уволенные, недоступные и удаленные мастера просто не вернутся из запроса
+            for employee_id in employee_ids:
+                self.remove(employee_id)
+
+        for employee_id, first_name, last_name, city, experience, status, open_count, in_progress_count in employees:
+            self.add(MasterProfile(
+                employee_id, f'{first_name} {last_name}', city, experience, status,
+                categories[employee_id], products[employee_id], service_products[employee_id],
+                open_count + in_progress_count,
+            ))
+
+    def refresh(self):
+        """Подтягивает изменения из ленты; полная перезагрузка - только при первом обращении или разрыве ленты"""
+        version = get_masters_version()
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            changed = None if self.version is None else get_master_changes(self.version, version)
+            self.load(changed)
+            self.version = version
+
+    def recommend(self, category_ids=(), product_ids=(), city='', k=10, refresh=True, statuses=None):
+        """Лучшие k мастеров для заказа (k=None - все кандидаты по убыванию оценки).
+
+        Кандидаты - мастера, покрывающие категории заказа (если категорий нет - товары,
+        если нет и товаров - все доступные мастера); statuses ограничивает их статусы.
+        """
+        if refresh:
+            self.refresh()
+        categories = {int(pk) for pk in category_ids}
+        products = {int(pk) for pk in product_ids}
+        if categories:
+            candidates = set().union(*(self.by_category.get(pk, ()) for pk in categories))
+        elif products:
+            candidates = set().union(*(self.by_product.get(pk, ()) for pk in products))
+        else:
+            candidates = self.profiles.keys()
+
+        city = normalize_city(city)
+        scored = []
+        for employee_id in candidates:
+            profile = self.profiles[employee_id]
+            if statuses is not None and profile.status not in statuses:
+                continue
+            value, city_match = score(profile, categories, products, city)
+            scored.append((value, -employee_id, profile, city_match))
+        top = heapq.nlargest(k, scored) if k else sorted(scored, reverse=True)
+        return [
+            Recommendation(profile.id, profile.name, round(value, 3), profile.open_orders, city_match)
+            for value, _, profile, city_match in top
+        ]
+
+
+master_index = MasterIndex()
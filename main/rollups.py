@@ -0,0 +1,180 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Greatest, TruncDate
+from django.utils import timezone
+
+from .models import ApplicationDailyStat, CityMasterStat, Employee, JobApplication, Order, OrderDailyStat
+from .recommendations import STATUS_WEIGHTS, normalize_city
+
+
+# Поля, по которым сводка группирует счетчик count
+KEYS = {
+    OrderDailyStat: ("day", "status"),
+    ApplicationDailyStat: ("day", "specialization"),
+    CityMasterStat: ("city",),
+}
+
+
+def _day(moment):
+    return timezone.localdate(moment)
+
+
+def apply_deltas(model, deltas):
+    """Прибавляет deltas = {ключ: приращение} к счетчикам сводки: UPDATE, для новой строки - INSERT"""
+    for key, n in deltas.items():
+        if not n:
+            continue
+        lookup = dict(zip(KEYS[model], key))
+        rows = model.objects.filter(**lookup)
+        if rows.update(count=Greatest(F("count") + n, 0)) or n < 0:
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(count=n, **lookup)
+        except IntegrityError:
+            # Строку успела создать параллельная транзакция
+            rows.update(count=F("count") + n)
+
+
+def orders_added(orders, sign=1):
+    """Учитывает созданные (sign=1) или удаленные (sign=-1) заказы orders = [(date_created, status)]"""
+    deltas = Counter()
+    for date_created, status in orders:
+        deltas[(_day(date_created), status)] += sign
+    apply_deltas(OrderDailyStat, deltas)
+
+
+def orders_moved(orders, status):
+    """Заказы orders = [(date_created, прежний статус)] перешли в статус status"""
+    deltas = Counter()
+    for date_created, old_status in orders:
+        if old_status != status:
+            day = _day(date_created)
+            deltas[(day, old_status)] -= 1
+            deltas[(day, status)] += 1
+    apply_deltas(OrderDailyStat, deltas)
+
+
+def applications_added(applications, sign=1):
+    """Учитывает анкеты applications = [(date_created, specialization)]"""
+    deltas = Counter()
+    for date_created, specialization in applications:
+        deltas[(_day(date_created), specialization)] += sign
+    apply_deltas(ApplicationDailyStat, deltas)
+
+
+def master_city(city, status, available):
+    """Город, в котором мастер учитывается как доступный для подбора (None - не учитывается)"""
+    return normalize_city(city) if available and status in STATUS_WEIGHTS else None
+
+
+def master_changed(old, new):
+    """Мастер перешел из состояния old в new; состояния - (city, status, available) или None"""
+    old_city = master_city(*old) if old else None
+    new_city = master_city(*new) if new else None
+    if old_city != new_city:
+        deltas = Counter()
+        if old_city:
+            deltas[(old_city,)] -= 1
+        if new_city:
+            deltas[(new_city,)] += 1
+        apply_deltas(CityMasterStat, deltas)
+
+
+def count_rollups():
+    """Сводки, посчитанные заново по заказам, анкетам и мастерам: {модель: {ключ: число}}"""
+    orders = (
+        Order.objects.annotate(day=TruncDate("date_created"))
+        .values("day", "status")
+        .annotate(n=Count("id"))
+        .values_list("day", "status", "n")
+        .order_by()
+    )
+    applications = (
+        JobApplication.objects.annotate(day=TruncDate("date_created"))
+        .values("day", "specialization")
+        .annotate(n=Count("id"))
+        .values_list("day", "specialization", "n")
+        .order_by()
+    )
+    masters = Counter(
+        (normalize_city(city),)
+        for city in Employee.objects.filter(available=True, status__in=STATUS_WEIGHTS).values_list("city", flat=True)
+    )
+    return {
+        OrderDailyStat: {(day, status): n for day, status, n in orders},
+        ApplicationDailyStat: {(day, specialization): n for day, specialization, n in applications},
+        CityMasterStat: dict(masters),
+    }
+
+
+def rebuild_rollups(dry_run=False):
+    """Сверяет сводки с данными и при расхождении пересобирает их. Возвращает {модель: число неверных строк}"""
+    changed = {}
+    for model, expected in count_rollups().items():
+        keys = KEYS[model]
+        current = {tuple(row[:-1]): row[-1] for row in model.objects.values_list(*keys, "count") if row[-1]}
+        changed[model] = sum(1 for key in expected.keys() | current.keys() if expected.get(key) != current.get(key))
+        if changed[model] and not dry_run:
+            model.objects.all().delete()
+            model.objects.bulk_create(
+                [model(count=n, **dict(zip(keys, key))) for key, n in expected.items()], batch_size=500
+            )
+    return changed
+
+
+def _conversion(counts):
+    """Доля выполненных среди созданных заказов, в процентах; спам не учитывается"""
+    total = sum(counts.values()) - counts["spam"]
+    return round(100 * counts["completed"] / total, 1) if total else None
+
+
+def dashboard_stats(days):
+    """Данные панели управления за последние days дней.
+
+    Читаются только сводки: три запроса по индексам, сколько бы лет заказов ни было в базе
+    """
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+
+    by_day = defaultdict(Counter)
+    for day, status, n in OrderDailyStat.objects.filter(day__gte=start, count__gt=0).values_list("day", "status", "count"):
+        by_day[day][status] = n
+    totals = Counter()
+    order_rows = []
+    for offset in range(days):
+        day = today - timedelta(days=offset)
+        counts = by_day.get(day, Counter())
+        totals.update(counts)
+        order_rows.append({
+            "day": day,
+            "counts": [counts[status] for status, _ in Order.STATUS_CHOICES],
+            "total": sum(counts.values()),
+            "conversion": _conversion(counts),
+        })
+
+    applications = list(
+        ApplicationDailyStat.objects.filter(day__gte=start)
+        .values("specialization")
+        .annotate(total=Sum("count"))
+        .filter(total__gt=0)
+        .order_by("-total", "specialization")
+    )
+    masters = list(CityMasterStat.objects.filter(count__gt=0).order_by("-count", "city"))
+
+    return {
+        "days": days,
+        "order_statuses": [label for _, label in Order.STATUS_CHOICES],
+        "order_rows": order_rows,
+        "order_totals": [totals[status] for status, _ in Order.STATUS_CHOICES],
+        "orders_total": sum(totals.values()),
+        "orders_completed": totals["completed"],
+        "conversion": _conversion(totals),
+        "applications": applications,
+        "applications_total": sum(row["total"] for row in applications),
+        "masters": masters,
+        "masters_total": sum(master.count for master in masters),
+    }
@@ -0,0 +1,262 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from transliterate import translit
+
+from .models import Category, Product, Service, Order, JobApplication, Employee
+
+
+# Полнотекстовый индекс SQLite FTS5 (создается миграцией 0018_search_index)
+SEARCH_TABLE = "main_search_index"
+
+# Вид документа -> модель. rowid документа = pk * KIND_FACTOR + номер вида,
+# поэтому обновление и удаление документа идут по первичному ключу индекса
+KINDS = {
+    "order": Order,
+    "employee": Employee,
+    "application": JobApplication,
+    "category": Category,
+    "product": Product,
+    "service": Service,
+}
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Поля, из которых собирается документ (get_document): сохранение без них индекс не трогает
+INDEXED_FIELDS = {
+    "order": ("name", "last_name", "middle_name", "phone", "city", "address", "comment", "work_description"),
+    "employee": ("first_name", "last_name", "middle_name", "phone", "email", "city", "slug"),
+    "application": ("first_name", "last_name", "phone", "city", "specialization", "comment"),
+    "category": ("name", "description", "slug"),
+    "product": ("name", "description", "slug"),
+    "service": ("name", "description", "slug"),
+}
+KIND_FACTOR = 16
+
+# Веса столбцов для bm25: kind, object_id, title, body, translit, url
+RANK_WEIGHTS = "0, 0, 10.0, 1.0, 0.5, 0"
+MAX_QUERY_TERMS = 8
+
+SearchHit = namedtuple("SearchHit", "kind label object_id title url snippet")
+
+_TOKEN_RE = re.compile(r"\w+")
+_HIGHLIGHT_START, _HIGHLIGHT_END = "\x02", "\x03"
+
+
+def normalize(text):
+    """ё -> е: токенизатор unicode61 сам приводит регистр, но не считает их одной буквой"""
+    return text.replace("ё", "е").replace("Ё", "Е")
+
+
+@lru_cache(maxsize=1024)
+def _variants(term):
+    """Слово запроса и его транслитерации в обе стороны: "щукин" -> {"щукин", "schukin"}"""
+    return {term, normalize(translit(term, "ru", reversed=True)), normalize(translit(term, "ru"))}
+
+
+def build_match(query):
+    """Строит выражение MATCH: каждое слово как префикс с вариантами транслитерации"""
+    terms = _TOKEN_RE.findall(normalize(query.lower()))[:MAX_QUERY_TERMS]
+    groups = []
+    for term in terms:
+        variants = " OR ".join(f'"{variant}"*' for variant in sorted(_variants(term)) if variant)
+        groups.append(f"({variants})")
+    return " AND ".join(groups)
+
+
+def _join(*parts):
+    return " ".join(str(part) for part in parts if part)
+
+
+def get_document(kind, obj):
+    """Возвращает (заголовок, текст, url) объекта для индекса"""
+    if kind == "order":
+        return (
+            obj.get_display_name(),
+            _join(obj.name, obj.last_name, obj.middle_name, obj.phone, obj.phone_digits,
+                  obj.city, obj.address, obj.comment, obj.work_description),
+            reverse("main:order_detail", args=[obj.pk]),
+        )
+    if kind == "employee":
+        specializations = ", ".join(s.name for s in obj.specialization.all()) if obj.pk else ""
+        return (
+            _join(obj.last_name, obj.first_name, obj.middle_name),
+            _join(obj.phone, obj.phone_digits, obj.email, obj.city, specializations),
+            reverse("main:employee_detail", args=[obj.slug]),
+        )
+    if kind == "application":
+        return (
+            _join(obj.last_name, obj.first_name),
+            _join(obj.phone, obj.phone_digits, obj.city, obj.specialization, obj.comment),
+            reverse("main:job_application_detail", args=[obj.pk]),
+        )
+    if kind == "category":
+        return obj.name, obj.description, reverse("main:category_detail", args=[obj.slug])
+    if kind == "product":
+        return obj.name, obj.description, reverse("main:product_detail_admin", args=[obj.slug])
+    return obj.name, obj.description, reverse("main:service_detail", args=[obj.slug])
+
+
+def get_kind(model):
+    for kind, kind_model in KINDS.items():
+        if issubclass(model, kind_model):
+            return kind
+    return None
+
+
+def _rowid(kind, pk):
+    return pk * KIND_FACTOR + KIND_CODES[kind]
+
+
+def _row(kind, obj):
+    title, body, url = get_document(kind, obj)
+    text = _join(title, body)
+    return (
+        _rowid(kind, obj.pk), kind, obj.pk,
+        normalize(title), normalize(body), normalize(translit(text, "ru", reversed=True)), url,
+    )
+
+
+_INSERT_SQL = (
+    f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, kind, object_id, title, body, translit, url) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+)
+
+
+def index_object(obj):
+    """Добавляет или обновляет документ объекта в индексе"""
+    kind = get_kind(type(obj))
+    with connection.cursor() as cursor:
+        cursor.execute(_INSERT_SQL, _row(kind, obj))
+
+
+def index_objects(objects):
+    """Добавляет или обновляет документы пачки объектов одной модели одним executemany"""
+    objects = list(objects)
+    if not objects:
+        return
+    kind = get_kind(type(objects[0]))
+    with connection.cursor() as cursor:
+        cursor.executemany(_INSERT_SQL, [_row(kind, obj) for obj in objects])
+
+
+def remove_object(model, pk):
+    kind = get_kind(model)
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [_rowid(kind, pk)])
+
+
+def rebuild_index(chunk_size=500):
+    """Полностью перестраивает индекс, возвращает {вид: число документов}"""
+    counts = {}
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        for kind, model in KINDS.items():
+            queryset = model.objects.all()
+            if kind == "employee":
+                queryset = queryset.prefetch_related("specialization")
+            rows = []
+            counts[kind] = 0
+            for obj in queryset.iterator(chunk_size=chunk_size):
+                rows.append(_row(kind, obj))
+                if len(rows) >= chunk_size:
+                    cursor.executemany(_INSERT_SQL, rows)
+                    counts[kind] += len(rows)
+                    rows = []
+            if rows:
+                cursor.executemany(_INSERT_SQL, rows)
+                counts[kind] += len(rows)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return counts
+
+
+def search_q(query, kind, field="pk"):
+    """Условие для фильтра списка: объекты вида kind, найденные по запросу"""
+    match = build_match(query)
+    if not match:
+        return Q(**{f"{field}__in": []})
+    return Q(**{f"{field}__in": RawSQL(
+        f"SELECT object_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND kind = %s",
+        (match, kind),
+    )})
+
+
+def substring_q(query, *fields):
+    """Подстрока в любом из полей (icontains), как искали списки до индекса.
+
+    Добавляется к search_q через |: индекс ищет по началу слова, а так находится
+    и середина слова ("ван" -> "Иван"), пусть и полным просмотром таблицы
+    """
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f"{field}__icontains": query})
+    return condition
+
+
+def _highlight(snippet):
+    """Экранирует фрагмент и подсвечивает найденные слова"""
+    html = escape(snippet).replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_END, "</mark>")
+    return mark_safe(html)
+
+
+class SearchResults:
+    """Ленивый результат поиска, упорядоченный по релевантности (bm25).
+
+    Поддерживает count() и срезы, поэтому отдается в Paginator как queryset:
+    на страницу выполняются один COUNT и один запрос с LIMIT/OFFSET.
+    """
+
+    def __init__(self, query, kind=None):
+        self.match = build_match(query)
+        self.kind = kind if kind in KINDS else None
+        self._count = None
+
+    def _where(self):
+        sql = f"{SEARCH_TABLE} MATCH %s"
+        params = [self.match]
+        if self.kind:
+            sql += " AND kind = %s"
+            params.append(self.kind)
+        return sql, params
+
+    def count(self):
+        if self._count is None:
+            if not self.match:
+                self._count = 0
+            else:
+                where, params = self._where()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT count(*) FROM {SEARCH_TABLE} WHERE {where}", params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        if not self.match:
+            return []
+        start = item.start or 0
+        limit = (item.stop - start) if item.stop is not None else -1
+        where, params = self._where()
+        sql = (
+            f"SELECT kind, object_id, title, url, "
+            f"snippet({SEARCH_TABLE}, 3, %s, %s, '…', 16) "
+            f"FROM {SEARCH_TABLE} WHERE {where} "
+            f"ORDER BY bm25({SEARCH_TABLE}, {RANK_WEIGHTS}) LIMIT %s OFFSET %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [_HIGHLIGHT_START, _HIGHLIGHT_END, *params, limit, start])
+            rows = cursor.fetchall()
+        return [
+            SearchHit(kind, KINDS[kind]._meta.verbose_name, object_id, title, url, _highlight(snippet))
+            for kind, object_id, title, url, snippet in rows
+        ]
@@ -1,17 +1,409 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
+from telegram.helpers import escape_markdown
 
-from .models import Order, JobApplication
-from .tg_bot import send_tg_message
-from asyncio import run
-from dotenv import load_dotenv
+from .models import Order, OrderImage, JobApplication, Category, Product, Service, Employee, Specialization
+from .images import schedule_derivatives, delete_derivatives
+from .cache import bump_catalog_version, bump_section_versions, record_master_changes, CATALOG_GRAPH_SECTION
+from .popularity import popularity_buffer
+from .notifications import enqueue
+from .search import INDEXED_FIELDS, get_kind, index_object, remove_object
+from . import coverage, rollups, workload
 
-import os
 import sys
 
-load_dotenv()
-TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
-TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    # Версию меняем после коммита, чтобы другие процессы не закэшировали старые данные
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    # Товар мог переехать в другую категорию - запоминаем старую
+    instance._old_category_slugs = list(
+        Product.objects.filter(pk=instance.pk).values_list('category__slug', flat=True)
+    ) if instance.pk and instance.has_changed('category') else []
+
+
+@receiver(pre_save, sender=Service)
+def remember_service_category(sender, instance, **kwargs):
+    instance._old_category_slugs = list(
+        Service.objects.filter(pk=instance.pk).values_list('product__category__slug', flat=True)
+    ) if instance.pk and instance.has_changed('product') else []
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_category_pages(sender, instance, **kwargs):
+    # Сбрасываем только главную и страницы затронутых категорий
+    if sender is Product:
+        category_id = instance.category_id
+    else:
+        category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+    sections = ['landing', CATALOG_GRAPH_SECTION, *getattr(instance, '_old_category_slugs', [])]
+    sections += Category.objects.filter(pk=category_id).values_list('slug', flat=True)
+    transaction.on_commit(lambda: bump_section_versions(*sections))
+
+
+@receiver(post_save, sender=Specialization)
+@receiver(post_delete, sender=Specialization)
+@receiver(m2m_changed, sender=Specialization.categories.through)
+def invalidate_catalog_graph(sender, **kwargs):
+    if kwargs.get('action', 'post').startswith('post'):
+        transaction.on_commit(lambda: bump_section_versions(CATALOG_GRAPH_SECTION))
+
+
+# Поле с изображением для моделей, у которых строятся уменьшенные копии
+IMAGE_FIELDS = {'main.Category': 'image', 'main.Product': 'image', 'main.Employee': 'image', 'users.User': 'avatar'}
+
+
+def _image_name(instance):
+    image = getattr(instance, IMAGE_FIELDS[instance._meta.label])
+    return image.name if image else None
+
+
+def _fields_changed(instance, created, update_fields, fields):
+    """Затронуло ли сохранение хотя бы одно из полей: обработчики post_save пропускают остальные сохранения"""
+    if created:
+        return True
+    if update_fields is not None:
+        return any(field in update_fields for field in fields)
+    has_changed = getattr(instance, 'has_changed', None)
+    return has_changed is None or has_changed(*fields)
+
+
+def _image_pages(instance):
+    """Разделы полностраничного кэша, где показывается изображение объекта"""
+    if isinstance(instance, Category):
+        return ['landing', instance.slug]
+    if isinstance(instance, Product):
+        return ['landing', *Category.objects.filter(pk=instance.category_id).values_list('slug', flat=True)]
+    return []
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Employee)
+@receiver(pre_save, sender='users.User')
+def remember_image_name(sender, instance, update_fields=None, **kwargs):
+    # Прежнее изображение: его копии удаляются, когда изображение заменили
+    field = IMAGE_FIELDS[instance._meta.label]
+    instance._old_image_name = None
+    if instance.pk is None or (update_fields is not None and field not in update_fields):
+        return
+    loaded = getattr(instance, 'get_loaded_values', lambda: None)() or {}
+    if field in loaded:
+        old = loaded[field]
+    else:
+        old = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+    instance._old_image_name = getattr(old, 'name', old) or None
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender='users.User')
+def build_image_derivatives(sender, instance, created, update_fields=None, **kwargs):
+    name = _image_name(instance)
+    # Вход пользователя (last_login), смена статуса сотрудника и т.п. изображение не трогают
+    if not _fields_changed(instance, created, update_fields, [IMAGE_FIELDS[instance._meta.label]]):
+        return
+    old_name = getattr(instance, '_old_image_name', None)
+    if old_name and old_name != name:
+        transaction.on_commit(lambda: delete_derivatives(old_name))
+    if name:
+        # Пока копий нет, страницы кэшируются с обычным <img> - сбрасываем их, когда копии готовы
+        sections = _image_pages(instance)
+        on_ready = (lambda: bump_section_versions(*sections)) if sections else None
+        transaction.on_commit(lambda: schedule_derivatives(name, on_ready))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender='users.User')
+def remove_image_derivatives(sender, instance, **kwargs):
+    name = _image_name(instance)
+    if name:
+        transaction.on_commit(lambda: delete_derivatives(name))
+
+
+@receiver(post_delete, sender=OrderImage)
+def remove_order_image_files(sender, instance, **kwargs):
+    # Файлы удаляем только после коммита: при откате запись и ее файлы остаются
+    storage = instance.image.storage
+    names = [file.name for file in (instance.image, instance.thumbnail) if file]
+
+    def delete_files():
+        for name in names:
+            storage.delete(name)
+
+    if names:
+        transaction.on_commit(delete_files)
+
+
+@receiver(m2m_changed, sender=Order.categories.through)
+@receiver(m2m_changed, sender=Order.products.through)
+def count_order_inclusion(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # Попадание в заказ повышает популярность категории/товара (запись в базу - в фоне)
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        popularity_buffer.add(instance.__class__, 'pk', instance.pk, len(pk_set))
+    else:
+        for pk in pk_set:
+            popularity_buffer.add(model, 'pk', pk)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=JobApplication)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Service)
+def update_search_index(sender, instance, created, update_fields=None, **kwargs):
+    # Пишем в той же транзакции, что и объект: при откате индекс откатится вместе с ним.
+    # Смена статуса, счетчиков и т.п. документ не меняет - индекс не трогаем
+    if _fields_changed(instance, created, update_fields, INDEXED_FIELDS[get_kind(sender)]):
+        index_object(instance)
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Employee)
+@receiver(post_delete, sender=JobApplication)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Service)
+def remove_from_search_index(sender, instance, **kwargs):
+    remove_object(sender, instance.pk)
+
+
+@receiver(m2m_changed, sender=Employee.specialization.through)
+def update_employee_specializations_index(sender, instance, action, reverse, pk_set, **kwargs):
+    # Названия специализаций входят в документ сотрудника
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        index_object(instance)
+    elif pk_set:
+        for employee in Employee.objects.filter(pk__in=pk_set).prefetch_related('specialization'):
+            index_object(employee)
+
+
+@receiver(m2m_changed, sender=Employee.categories.through)
+def update_direct_coverage(sender, instance, action, reverse, pk_set, **kwargs):
+    # Таблица покрытия EmployeeCategory обновляется в той же транзакции, что и связи
+    coverage.employee_categories_changed(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Employee.specialization.through)
+def update_specialization_coverage(sender, instance, action, reverse, pk_set, **kwargs):
+    coverage.employee_specializations_changed(instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Specialization.categories.through)
+def update_specialization_categories_coverage(sender, instance, action, reverse, pk_set, **kwargs):
+    coverage.specialization_categories_changed(instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=Specialization)
+def reindex_specialization_employees(sender, instance, created, **kwargs):
+    if not created:
+        for employee in instance.employee_set.prefetch_related('specialization'):
+            index_object(employee)
+
+
+# Лента изменений для индекса подбора мастеров: после коммита отмечаем, чьи профили перечитать
+
+def _record_master_changes(employee_ids):
+    employee_ids = None if employee_ids is None else list(employee_ids)
+    transaction.on_commit(lambda: record_master_changes(employee_ids))
+
+
+# Поля сотрудника, которые читает индекс подбора (MasterIndex.load)
+MASTER_INDEX_FIELDS = ('first_name', 'last_name', 'city', 'experience', 'status', 'available')
+
+
+@receiver(post_save, sender=Employee)
+def track_employee_changes(sender, instance, created, update_fields=None, **kwargs):
+    if _fields_changed(instance, created, update_fields, MASTER_INDEX_FIELDS):
+        _record_master_changes([instance.pk])
+
+
+@receiver(post_delete, sender=Employee)
+def track_employee_deletion(sender, instance, **kwargs):
+    _record_master_changes([instance.pk])
+
+
+@receiver(m2m_changed, sender=Employee.categories.through)
+@receiver(m2m_changed, sender=Employee.specialization.through)
+@receiver(m2m_changed, sender=Employee.products.through)
+@receiver(m2m_changed, sender=Employee.services.through)
+@receiver(m2m_changed, sender=Order.assigned_employees.through)
+def track_employee_relations(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if isinstance(instance, Employee):
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _record_master_changes([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        _record_master_changes(pk_set)
+    elif action == 'pre_clear':
+        # После очистки связей уже не узнать, каких сотрудников она затронула
+        _record_master_changes(
+            sender.objects.filter(**{f'{instance._meta.model_name}_id': instance.pk}).values_list('employee_id', flat=True)
+        )
+
+
+@receiver(m2m_changed, sender=Specialization.categories.through)
+def track_specialization_categories(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        specialization_ids = [instance.pk]
+    elif action == 'pre_clear':
+        specialization_ids = list(sender.objects.filter(category_id=instance.pk).values_list('specialization_id', flat=True))
+    else:
+        specialization_ids = pk_set
+    _record_master_changes(
+        Employee.specialization.through.objects.filter(specialization_id__in=specialization_ids)
+        .values_list('employee_id', flat=True)
+    )
+
+
+# Счетчики загрузки мастеров (Employee.open_orders_count и др.)
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, update_fields=None, **kwargs):
+    instance._old_workload_state = None
+    if instance.pk and (update_fields is None or 'status' in update_fields):
+        loaded = instance.get_loaded_values() or {}
+        if 'status' in loaded and 'date_completed' in loaded:
+            # Заказ загружен из базы - прежний статус известен без запроса
+            instance._old_workload_state = (loaded['status'], loaded['date_completed'])
+        else:
+            instance._old_workload_state = (
+                Order.objects.filter(pk=instance.pk).values_list('status', 'date_completed').first()
+            )
+
+
+@receiver(post_save, sender=Order)
+def update_workload_on_status(sender, instance, **kwargs):
+    old = getattr(instance, '_old_workload_state', None)
+    new = (instance.status, instance.date_completed)
+    if old is None or workload.counter_field(*old) == workload.counter_field(*new):
+        return
+    employee_ids = list(instance.assigned_employees.values_list('pk', flat=True))
+    workload.status_changed(employee_ids, old, new)
+    _record_master_changes(employee_ids)
+
+
+@receiver(pre_delete, sender=Order)
+def update_workload_on_delete(sender, instance, **kwargs):
+    # Связи с мастерами удалятся каскадом без m2m_changed
+    employee_ids = list(instance.assigned_employees.values_list('pk', flat=True))
+    if employee_ids:
+        workload.orders_assigned(employee_ids, Order.objects.filter(pk=instance.pk).values_list('status', 'date_completed'), -1)
+    _record_master_changes(employee_ids)
+
+
+@receiver(m2m_changed, sender=Order.assigned_employees.through)
+def update_workload_on_assignment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        # instance - мастер, pk_set - заказы
+        order_ids = pk_set if action != 'pre_clear' else sender.objects.filter(employee_id=instance.pk).values_list('order_id', flat=True)
+        orders = Order.objects.filter(pk__in=order_ids).values_list('status', 'date_completed')
+        workload.orders_assigned([instance.pk], orders, sign)
+    else:
+        employee_ids = pk_set if action != 'pre_clear' else sender.objects.filter(order_id=instance.pk).values_list('employee_id', flat=True)
+        workload.orders_assigned(employee_ids, [(instance.status, instance.date_completed)], sign)
+
+
+# Сводки для панели управления (OrderDailyStat и др.)
+
+@receiver(post_save, sender=Order)
+def update_order_rollup(sender, instance, created, **kwargs):
+    if created:
+        rollups.orders_added([(instance.date_created, instance.status)])
+        return
+    old = getattr(instance, '_old_workload_state', None)
+    if old is not None and old[0] != instance.status:
+        rollups.orders_moved([(instance.date_created, old[0])], instance.status)
+
+
+@receiver(post_delete, sender=Order)
+def update_order_rollup_on_delete(sender, instance, **kwargs):
+    loaded = instance.get_loaded_values() or {}
+    rollups.orders_added([(instance.date_created, loaded.get('status', instance.status))], -1)
+
+
+@receiver(pre_save, sender=JobApplication)
+def remember_application_specialization(sender, instance, update_fields=None, **kwargs):
+    instance._old_specialization = None
+    if instance.pk and (update_fields is None or 'specialization' in update_fields):
+        loaded = instance.get_loaded_values() or {}
+        if 'specialization' in loaded:
+            instance._old_specialization = loaded['specialization']
+        else:
+            instance._old_specialization = (
+                JobApplication.objects.filter(pk=instance.pk).values_list('specialization', flat=True).first()
+            )
+
+
+@receiver(post_save, sender=JobApplication)
+def update_application_rollup(sender, instance, created, **kwargs):
+    if created:
+        rollups.applications_added([(instance.date_created, instance.specialization)])
+        return
+    old = getattr(instance, '_old_specialization', None)
+    if old is not None and old != instance.specialization:
+        rollups.applications_added([(instance.date_created, old)], -1)
+        rollups.applications_added([(instance.date_created, instance.specialization)])
+
+
+@receiver(post_delete, sender=JobApplication)
+def update_application_rollup_on_delete(sender, instance, **kwargs):
+    loaded = instance.get_loaded_values() or {}
+    rollups.applications_added([(instance.date_created, loaded.get('specialization', instance.specialization))], -1)
+
+
+MASTER_ROLLUP_FIELDS = ('city', 'status', 'available')
+
+
+@receiver(pre_save, sender=Employee)
+def remember_master_city(sender, instance, update_fields=None, **kwargs):
+    instance._old_master_state = None
+    if instance.pk and (update_fields is None or set(MASTER_ROLLUP_FIELDS) & set(update_fields)):
+        loaded = instance.get_loaded_values() or {}
+        if all(field in loaded for field in MASTER_ROLLUP_FIELDS):
+            instance._old_master_state = tuple(loaded[field] for field in MASTER_ROLLUP_FIELDS)
+        else:
+            instance._old_master_state = Employee.objects.filter(pk=instance.pk).values_list(*MASTER_ROLLUP_FIELDS).first()
+
+
+@receiver(post_save, sender=Employee)
+def update_master_rollup(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_master_state', None)
+    if created or old is not None:
+        rollups.master_changed(old, tuple(getattr(instance, field) for field in MASTER_ROLLUP_FIELDS))
+
+
+@receiver(post_delete, sender=Employee)
+def update_master_rollup_on_delete(sender, instance, **kwargs):
+    loaded = instance.get_loaded_values() or {}
+    rollups.master_changed(tuple(loaded.get(field, getattr(instance, field)) for field in MASTER_ROLLUP_FIELDS), None)
+
+
+def _markdown(value):
+    """Экранирует введенный клиентом текст для Markdown-сообщения в Telegram"""
+    return escape_markdown(str(value or ''), version=1)
 
 
 @receiver(post_save, sender=Order)
@@ -26,14 +418,15 @@ def send_order_message(sender, instance, created, **kwargs):
         message = f"""
 *Новая заявка!*
 
-*Имя:* {instance.name}
-*Телефон:* {instance.phone}
-*Комментарий:* {instance.comment or 'не указан'}
+*Имя:* {_markdown(instance.name)}
+*Телефон:* {_markdown(instance.phone)}
+*Комментарий:* {_markdown(instance.comment) or 'не указан'}
 *Дата создания:* {date_created}
 *Ссылка на заявку:* [открыть]({url})
 """
 
-        run(send_tg_message(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, message))
+        # Запись попадает в ту же транзакцию, отправкой занимается manage.py send_notifications
+        enqueue(message, summary=f"{instance.name}, {instance.phone}", url=url)
 
 
 @receiver(post_save, sender=JobApplication)
@@ -48,12 +441,13 @@ def send_job_application_message(sender, instance, created, **kwargs):
         message = f"""
 *Новая заявка!*
 
-*Имя:* {instance.first_name} {instance.last_name}
-*Телефон:* {instance.phone}
-*Город:* {instance.city}
-*Специализация:* {instance.specialization}
+*Имя:* {_markdown(instance.first_name)} {_markdown(instance.last_name)}
+*Телефон:* {_markdown(instance.phone)}
+*Город:* {_markdown(instance.city)}
+*Специализация:* {_markdown(instance.specialization)}
 *Дата создания:* {date_created}
 *Ссылка на заявку:* [открыть]({url})
 """
 
-        run(send_tg_message(TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, message))
\ No newline at end of file
+        # Запись попадает в ту же транзакцию, отправкой занимается manage.py send_notifications
+        enqueue(message, summary=f"Анкета: {instance.first_name} {instance.last_name}, {instance.specialization}", url=url)
\ No newline at end of file
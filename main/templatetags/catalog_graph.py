@@ -0,0 +1,16 @@
+from django import template
+from django.urls import reverse
+
+from main.cache import get_catalog_graph_version
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def catalog_graph_url():
+    """Адрес снимка связей каталога текущей версии.
+
+    Пример: fetch('{% catalog_graph_url %}')
+    """
+    return reverse("main:catalog_graph", kwargs={"version": get_catalog_graph_version()})
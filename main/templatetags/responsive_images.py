@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from main.images import get_derivatives
+
+
+register = template.Library()
+
+
+def _srcset(derivatives):
+    return ", ".join(f"{url} {width}w" for width, url in derivatives)
+
+
+@register.simple_tag
+def responsive_image(image, alt="", sizes="100vw", **attrs):
+    """Выводит <picture> с WebP и srcset из уменьшенных копий, если они уже готовы.
+
+    Пример: {% responsive_image category.image alt=category.name sizes="(max-width: 768px) 100vw, 33vw" %}
+    """
+    if not image:
+        return ""
+
+    extra = format_html_join("", ' {}="{}"', ((key.replace("_", "-"), value) for key, value in attrs.items()))
+    derivatives = get_derivatives(image.name)
+    if not derivatives["original"]:
+        return format_html('<img src="{}" alt="{}" loading="lazy"{}>', image.url, alt, extra)
+
+    webp_source = ""
+    if derivatives["webp"]:
+        webp_source = format_html(
+            '<source type="image/webp" srcset="{}" sizes="{}">', _srcset(derivatives["webp"]), sizes
+        )
+    return format_html(
+        '<picture style="display: contents;">{}<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy"{}></picture>',
+        webp_source,
+        image.url,
+        _srcset(derivatives["original"]),
+        sizes,
+        alt,
+        extra,
+    )
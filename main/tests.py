@@ -1,3 +1,937 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import re
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.text import slugify
+from PIL import Image
+from transliterate import translit
+
+from .bulk_status import set_order_status
+from .cache import get_page_cache_key, get_section_version
+from .coverage import covering_employees, diff_coverage
+from .forms import CategoryForm
+from .images import derivative_name, generate_derivatives, get_derivatives, manifest_name, normalize_photo
+from .models import (
+    CityMasterStat, Category, Employee, JobApplication, Notification, Order, OrderDailyStat, OrderImage, Product,
+    Service, Specialization, allocate_slugs, create_slug, phone_search_q,
+)
+from .notifications import (
+    DIGEST_THRESHOLD, MAX_ATTEMPTS, RETRY_BASE_DELAY, LocmemTransport, deliver_pending, enqueue, retry_delay,
+)
+from .popularity import popularity_buffer
+from .recommendations import MasterIndex
+from .search import SEARCH_TABLE, search_q
+from .rollups import dashboard_stats, rebuild_rollups
+from .views import LandingView, filter_orders
+from .workload import recount_workload
+
+
+def make_employee(**kwargs):
+    values = {
+        'first_name': 'Петр', 'last_name': 'Иванов', 'middle_name': 'Сергеевич', 'birth_date': date(1990, 1, 1),
+        'phone': '+79001234568', 'city': 'Екатеринбург', 'experience': 3,
+    }
+    values.update(kwargs)
+    return Employee.objects.create(**values)
+
+
+class FailingTransport(LocmemTransport):
+    """Заглушка, у которой каждая отправка заканчивается ошибкой"""
+
+    def send(self, chat_id, text, parse_mode='Markdown'):
+        raise ConnectionError('telegram недоступен')
+
+
+@override_settings(NOTIFICATION_TRANSPORT='main.notifications.LocmemTransport')
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        LocmemTransport.outbox.clear()
+
+    def test_client_order_is_queued_and_sent(self):
+        order = Order.objects.create(name='Иван', phone='+79123456789', city='Екатеринбург', created_by_client=True)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, 'pending')
+        self.assertTrue(notification.url.endswith(f'/dashboard/order/{order.pk}/'))
+        self.assertEqual(LocmemTransport.outbox, [])
+
+        self.assertEqual(deliver_pending(), (1, 0))
+        self.assertEqual(len(LocmemTransport.outbox), 1)
+        self.assertIn('Иван', LocmemTransport.outbox[0]['text'])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertIsNotNone(notification.date_sent)
+
+    def test_client_input_is_escaped_in_messages(self):
+        Order.objects.create(
+            name='Иван_Петров', phone='+79123456789', city='Пермь', comment='*срочно* [сайт](http://example.com) `код`',
+            created_by_client=True,
+        )
+        JobApplication.objects.create(
+            first_name='Анна*', last_name='Ли_', phone='+79123456780', age=30, city='[Пермь]',
+            specialization='сантехник_', created_by_client=True,
+        )
+        order_text, application_text = Notification.objects.order_by('pk').values_list('text', flat=True)
+        self.assertIn('*Имя:* Иван\\_Петров', order_text)
+        self.assertIn('*Комментарий:* \\*срочно\\* \\[сайт](http://example.com) \\`код\\`', order_text)
+        self.assertIn('*Имя:* Анна\\* Ли\\_', application_text)
+        self.assertIn('*Город:* \\[Пермь]', application_text)
+        self.assertIn('*Специализация:* сантехник\\_', application_text)
+
+    def test_staff_order_is_not_queued(self):
+        Order.objects.create(name='Иван', phone='+79123456789', city='Екатеринбург')
+        self.assertFalse(Notification.objects.exists())
+
+    def test_failed_send_is_retried_with_backoff(self):
+        notification = enqueue('Тест', chat_id='1')
+
+        with self.assertLogs('main.notifications', 'WARNING'):
+            self.assertEqual(deliver_pending(FailingTransport()), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'pending')
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn('telegram недоступен', notification.last_error)
+        delay = notification.next_attempt_at - timezone.now()
+        self.assertGreater(delay, timedelta(seconds=RETRY_BASE_DELAY - 5))
+        self.assertLessEqual(delay, timedelta(seconds=RETRY_BASE_DELAY))
+
+        # До следующей попытки запись не трогается
+        self.assertEqual(deliver_pending(FailingTransport()), (0, 0))
+
+        # Когда время пришло, уходит обычной отправкой
+        Notification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_pending(), (1, 0))
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts, notification.last_error), ('sent', 2, ''))
+
+    def test_retry_delay_grows_and_is_capped(self):
+        self.assertEqual(retry_delay(1), timedelta(seconds=RETRY_BASE_DELAY))
+        self.assertEqual(retry_delay(2), timedelta(seconds=RETRY_BASE_DELAY * 2))
+        self.assertEqual(retry_delay(100), retry_delay(101))
+
+    def test_gives_up_after_max_attempts(self):
+        notification = enqueue('Тест', chat_id='1')
+        with self.assertLogs('main.notifications', 'WARNING'):
+            for _ in range(MAX_ATTEMPTS):
+                Notification.objects.update(next_attempt_at=timezone.now())
+                deliver_pending(FailingTransport())
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), ('failed', MAX_ATTEMPTS))
+
+    def test_burst_is_sent_as_one_digest(self):
+        for i in range(DIGEST_THRESHOLD):
+            enqueue(f'Заявка {i}', chat_id='1', summary=f'Клиент {i}', url=f'https://example.com/{i}/')
+        enqueue('Другой чат', chat_id='2')
+
+        self.assertEqual(deliver_pending(), (DIGEST_THRESHOLD + 1, 0))
+        by_chat = {message['chat_id']: message for message in LocmemTransport.outbox}
+        self.assertEqual(len(LocmemTransport.outbox), 2)
+        digest = by_chat['1']['text']
+        self.assertIn(f'Новых заявок: {DIGEST_THRESHOLD}', digest)
+        for i in range(DIGEST_THRESHOLD):
+            self.assertIn(f'Клиент {i}', digest)
+            self.assertIn(f'https://example.com/{i}/', digest)
+        self.assertEqual(by_chat['2']['text'], 'Другой чат')
+        self.assertFalse(Notification.objects.exclude(status='sent').exists())
+
+    def test_digest_escapes_client_summary(self):
+        for name in ('Иван_Петров', 'Анна*', 'Ольга [дача]'):
+            enqueue('Заявка', chat_id='1', summary=name)
+
+        deliver_pending()
+        digest = LocmemTransport.outbox[0]['text']
+        self.assertIn('Иван\\_Петров', digest)
+        self.assertIn('Анна\\*', digest)
+        self.assertIn('Ольга \\[дача]', digest)
+
+
+class DirtyFieldsTests(TestCase):
+    def setUp(self):
+        self.employee = Employee.objects.get(pk=make_employee().pk)
+
+    def test_save_without_changes_writes_nothing(self):
+        # Счетчик изменился в обход объекта, устаревший экземпляр не должен его затереть
+        Employee.objects.filter(pk=self.employee.pk).update(open_orders_count=5)
+        with self.assertNumQueries(0):
+            self.employee.save()
+        self.assertEqual(Employee.objects.get(pk=self.employee.pk).open_orders_count, 5)
+
+    def test_save_writes_only_changed_fields(self):
+        Employee.objects.filter(pk=self.employee.pk).update(open_orders_count=5)
+        self.employee.status = 'vacation'
+        with CaptureQueriesContext(connection) as queries:
+            self.employee.save()
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "main_employee"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"status"', updates[0])
+        self.assertNotIn('open_orders_count', updates[0])
+        self.assertEqual(Employee.objects.get(pk=self.employee.pk).open_orders_count, 5)
+
+    def test_has_changed_compares_with_loaded_values(self):
+        self.assertFalse(self.employee.has_changed('city'))
+        self.employee.city = 'Пермь'
+        self.assertTrue(self.employee.has_changed('city'))
+        self.assertEqual(self.employee.get_dirty_fields(), {'city'})
+        self.employee.save()
+        self.assertFalse(self.employee.has_changed('city'))
+
+
+class SearchIndexTests(TestCase):
+    def index_writes(self, queries):
+        return [q['sql'] for q in queries.captured_queries if SEARCH_TABLE in q['sql']]
+
+    def test_finds_by_prefix_yo_and_translit(self):
+        order = Order.objects.create(name='Алёна', last_name='Щукина', phone='+79123456789', city='Екатеринбург')
+        for query in ('щук', 'алена', 'schukina', 'ален щукина', '7912345'):
+            self.assertEqual(list(Order.objects.filter(search_q(query, 'order'))), [order], query)
+        self.assertFalse(Order.objects.filter(search_q('петров', 'order')).exists())
+        self.assertFalse(Order.objects.filter(search_q('!!!', 'order')).exists())
+
+    def test_list_filter_keeps_substring_matches(self):
+        order = Order.objects.create(name='Иван', phone='+79123456789', city='Екатеринбург')
+        # Середину слова префиксный индекс не находит, списки добирают ее через icontains
+        self.assertFalse(Order.objects.filter(search_q('ван', 'order')).exists())
+        self.assertEqual(list(filter_orders(Order.objects.all(), {'search': 'ван'})), [order])
+        self.assertEqual(list(filter_orders(Order.objects.all(), {'search': 'катер'})), [order])
+
+    def test_kinds_do_not_mix(self):
+        make_employee(last_name='Щукин')
+        self.assertFalse(Order.objects.filter(search_q('щукин', 'order')).exists())
+        self.assertTrue(Employee.objects.filter(search_q('щукин', 'employee')).exists())
+
+    def test_reindexes_only_when_document_changes(self):
+        order = Order.objects.get(pk=Order.objects.create(name='Иван', phone='+79123456789', city='Пермь').pk)
+
+        order.status = 'confirmed'
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        self.assertEqual(self.index_writes(queries), [])
+
+        order.address = 'ул. Ленина, 1'
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        self.assertEqual(len(self.index_writes(queries)), 1)
+        self.assertTrue(Order.objects.filter(search_q('ленина', 'order')).exists())
+
+    def test_deleted_object_leaves_index(self):
+        order = Order.objects.create(name='Иван', phone='+79123456789', city='Пермь')
+        order.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        # Лента изменений мастеров пополняется после коммита - выполняем эти колбэки
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Сантехника')
+            self.local = make_employee(last_name='Местный', city='Екатеринбург', phone='+79001234561')
+            self.remote = make_employee(last_name='Приезжий', city='Пермь', phone='+79001234562')
+            self.part_time = make_employee(last_name='Совместитель', status='part_time', city='Пермь', phone='+79001234563')
+            make_employee(last_name='Без категории', phone='+79001234564')
+            for employee in (self.local, self.remote, self.part_time):
+                employee.categories.add(self.category)
+
+    def recommend(self, **kwargs):
+        return [rec.employee_id for rec in MasterIndex().recommend([self.category.pk], city='Екатеринбург, ул. Ленина 1', k=None, **kwargs)]
+
+    def test_only_covering_masters_ranked_by_city(self):
+        self.assertEqual(self.recommend(), [self.local.pk, self.remote.pk, self.part_time.pk])
+        self.assertEqual(self.recommend(statuses=('active',)), [self.local.pk, self.remote.pk])
+
+    def test_open_orders_lower_the_score(self):
+        order = Order.objects.create(name='Иван', phone='+79123456789', city='Екатеринбург', status='confirmed')
+        order.assigned_employees.add(self.local)
+        self.local.refresh_from_db()
+        self.assertEqual(self.local.open_orders_count, 1)
+
+        order.status = 'completed'
+        order.save()
+        self.local.refresh_from_db()
+        self.assertEqual((self.local.open_orders_count, self.local.completed_recent_count), (0, 1))
+
+        order.delete()
+        self.local.refresh_from_db()
+        self.assertEqual(self.local.completed_recent_count, 0)
+
+    def test_order_form_options(self):
+        staff = get_user_model().objects.create_user('staff@example.com', 'Анна', 'Петрова', 'x', is_staff=True)
+        self.client.force_login(staff)
+        params = {'category_ids[]': [self.category.pk], 'city': 'Екатеринбург'}
+
+        response = self.client.get('/ajax/options/', params)
+        data = response.json()
+        self.assertEqual(list(data), ['employees'])
+        self.assertEqual([row['id'] for row in data['employees']], [self.local.pk, self.remote.pk])
+        self.assertTrue(data['employees'][0]['city_match'])
+
+        response = self.client.get('/ajax/options/', params, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_workload_outweighs_city(self):
+        for i in range(5):
+            Order.objects.create(name='Иван', phone='+79123456789', city='Екатеринбург', status='confirmed').assigned_employees.add(self.local)
+        self.assertEqual(self.recommend(statuses=('active',)), [self.remote.pk, self.local.pk])
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PageHitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        popularity_buffer.flush()
+        self.category = Category.objects.create(name='Сантехника')
+        self.url = f'/{self.category.slug}/'
+
+    def tearDown(self):
+        popularity_buffer.max_keys = 10000
+
+    def test_hits_are_keyed_by_pk_including_cached_and_304(self):
+        response = self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(popularity_buffer.flush(), 1)
+        self.assertEqual(Category.objects.get(pk=self.category.pk).popularity, 3)
+
+    def test_missing_page_is_not_counted(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.client.get('/net-takoi-kategorii/').status_code, 404)
+        self.assertEqual(popularity_buffer.flush(), 0)
+
+    def test_buffer_drops_new_objects_when_full(self):
+        popularity_buffer.max_keys = 1
+        other = Category.objects.create(name='Электрика')
+        self.client.get(self.url)
+        self.client.get(f'/{other.slug}/')
+        self.client.get(self.url)
+        with self.assertLogs('main.popularity', 'WARNING'):
+            popularity_buffer.flush()
+        self.assertEqual(Category.objects.get(pk=self.category.pk).popularity, 2)
+        self.assertEqual(Category.objects.get(pk=other.pk).popularity, 0)
+
+
+def make_image(name, size=(1000, 600)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+def use_temp_media_root(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root)
+    settings_override = override_settings(MEDIA_ROOT=media_root)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        use_temp_media_root(self)
+        with mock.patch('main.signals.schedule_derivatives'):
+            self.category = Category.objects.create(name='Сантехника', image=make_image('santehnika.jpg'))
+
+    def test_page_reads_manifest_instead_of_checking_files(self):
+        name = self.category.image.name
+        self.assertEqual(len(generate_derivatives(name)), 6)
+        self.assertTrue(default_storage.exists(manifest_name(name)))
+
+        cache.clear()
+        with mock.patch.object(default_storage, 'exists', side_effect=AssertionError('exists() на странице')):
+            derivatives = get_derivatives(name)
+        self.assertEqual([width for width, url in derivatives['webp']], [320, 640, 960])
+        self.assertEqual(derivatives['original'][0][1], default_storage.url(derivative_name(name, 320)))
+
+        # Повторный запуск ничего не создает
+        self.assertEqual(generate_derivatives(name), [])
+
+    def test_small_image_gets_empty_manifest(self):
+        name = default_storage.save('images/category/small.jpg', make_image('small.jpg', (200, 100)))
+        self.assertEqual(generate_derivatives(name), [])
+        self.assertEqual(get_derivatives(name), {'original': [], 'webp': []})
+        self.assertTrue(default_storage.exists(manifest_name(name)))
+
+    def test_replaced_image_drops_old_derivatives_and_refreshes_pages(self):
+        old_name = self.category.image.name
+        generate_derivatives(old_name)
+        category = Category.objects.get(pk=self.category.pk)
+        category.image = make_image('new.jpg')
+
+        with mock.patch('main.signals.schedule_derivatives') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                category.save()
+        self.assertFalse(default_storage.exists(derivative_name(old_name, 320)))
+        self.assertFalse(default_storage.exists(manifest_name(old_name)))
+
+        name, on_ready = schedule.call_args.args
+        self.assertEqual(name, category.image.name)
+        version = get_section_version(category.slug)
+        on_ready()
+        self.assertEqual(get_section_version(category.slug), version + 1)
+
+    def test_other_changes_do_not_touch_derivatives(self):
+        category = Category.objects.get(pk=self.category.pk)
+        category.description = 'Трубы и краны'
+        with mock.patch('main.signals.schedule_derivatives') as schedule, mock.patch('main.signals.delete_derivatives') as delete:
+            with self.captureOnCommitCallbacks(execute=True):
+                category.save()
+        schedule.assert_not_called()
+        delete.assert_not_called()
+
+
+class OrderPhotoTests(TestCase):
+    def setUp(self):
+        use_temp_media_root(self)
+        self.order = Order.objects.create(name='Иван', phone='+79123456789', city='Пермь')
+
+    def test_thumbnails_of_same_named_photos_do_not_collide(self):
+        jpeg = default_storage.path(default_storage.save('images/orders/additional/photo.jpg', make_image('photo.jpg')))
+        buffer = BytesIO()
+        Image.new('RGBA', (3000, 1000)).save(buffer, format='PNG')
+        png = default_storage.path(default_storage.save('images/orders/additional/photo.png', SimpleUploadedFile('photo.png', buffer.getvalue())))
+
+        jpeg_photo, jpeg_thumb = normalize_photo(jpeg)
+        png_photo, png_thumb = normalize_photo(png)
+        self.assertEqual(jpeg_photo, jpeg)
+        self.assertNotEqual(jpeg_thumb, png_thumb)
+        self.assertEqual(len({jpeg_photo, jpeg_thumb, png, png_photo, png_thumb}), 5)
+        with Image.open(png_photo) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (2048, 683)))
+        with Image.open(png_thumb) as image:
+            self.assertEqual(max(image.size), 400)
+
+        # Новое фото под тем же именем (прежний оригинал уже удален) не затирает готовые файлы
+        again_photo, again_thumb = normalize_photo(png)
+        self.assertEqual(len({png_photo, png_thumb, again_photo, again_thumb}), 4)
+
+    def test_deleting_photo_removes_its_files(self):
+        image = OrderImage.objects.create(order=self.order, image=make_image('photo.jpg'))
+        photo, thumb = normalize_photo(default_storage.path(image.image.name))
+        OrderImage.objects.filter(pk=image.pk).update(thumbnail=os.path.relpath(thumb, default_storage.location))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.delete()
+        self.assertFalse(os.path.exists(photo))
+        self.assertFalse(os.path.exists(thumb))
+
+
+class SlugTests(TestCase):
+    def test_create_slug_matches_full_transliteration(self):
+        for name in ('Замена смесителя', 'Щука и ёлки', 'Объём ЖКХ', 'Ремонт №5 (срочно)'):
+            self.assertEqual(create_slug(name), slugify(translit(name, 'ru', reversed=True)), name)
+        self.assertEqual(create_slug('Café'), 'cafe')
+
+    def test_duplicates_get_next_free_number(self):
+        for name in ('Сантехника', 'Сантехника', 'Сантехника-сервис'):
+            Category.objects.create(name=name)
+        self.assertEqual(
+            list(Category.objects.order_by('pk').values_list('slug', flat=True)),
+            ['santehnika', 'santehnika-1', 'santehnika-servis'],
+        )
+
+    def test_batch_is_allocated_with_one_query(self):
+        Category.objects.create(name='Сантехника')
+        Category.objects.create(name='Электрика')
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(Category, ['santehnika', 'santehnika', 'elektrika', 'krovlya'])
+        self.assertEqual(slugs, ['santehnika-1', 'santehnika-2', 'elektrika-1', 'krovlya'])
+
+    def test_numbered_slug_fits_max_length(self):
+        name = 'Очень длинное название ' * 10
+        first = Category.objects.create(name=name)
+        second = Category.objects.create(name=name)
+        self.assertEqual(len(first.slug), 100)
+        self.assertEqual(len(second.slug), 100)
+        self.assertEqual(second.slug, f'{first.slug[:98]}-1')
+        self.assertEqual(allocate_slugs(Category, [first.slug]), [f'{first.slug[:98]}-2'])
+
+    def test_own_slug_is_not_taken(self):
+        category = Category.objects.create(name='Сантехника')
+        self.assertEqual(allocate_slugs(Category, ['santehnika'], exclude_pk=category.pk), ['santehnika'])
+
+
+class CatalogImportTests(TestCase):
+    def run_import(self, text, fmt='csv'):
+        stdin = io.TextIOWrapper(io.BytesIO(text.encode('utf-8-sig')), encoding='ascii')
+        with mock.patch('sys.stdin', stdin):
+            call_command('catalog_import', '-', format=fmt, stdout=io.StringIO())
+
+    def test_stdin_with_bom_in_utf8(self):
+        self.run_import(
+            'type,slug,name,parent,price\n'
+            'category,,Сантехника,,\n'
+            'product,,Смеситель,santehnika,1500\n'
+        )
+        product = Product.objects.get()
+        self.assertEqual((product.name, product.slug, product.category.slug), ('Смеситель', 'smesitel', 'santehnika'))
+
+    def test_rename_regenerates_slug_like_save(self):
+        Category.objects.create(name='Электрика')
+        category = Category.objects.create(name='Сантехника')
+        self.run_import(
+            '{"type": "category", "slug": "santehnika", "name": "Электрика"}\n'
+            '{"type": "product", "name": "Розетка", "parent": "santehnika", "price": 300}\n',
+            fmt='jsonl',
+        )
+        category.refresh_from_db()
+        self.assertEqual((category.name, category.slug), ('Электрика', 'elektrika-1'))
+        self.assertEqual(Product.objects.get().category, category)
+
+    def test_same_slug_base_is_kept(self):
+        Category.objects.create(name='Сантехника')
+        category = Category.objects.create(name='Сантехника')
+        self.run_import('type,slug,name\ncategory,santehnika-1,САНТЕХНИКА\n')
+        category.refresh_from_db()
+        self.assertEqual((category.name, category.slug), ('САНТЕХНИКА', 'santehnika-1'))
+
+    def catalog(self):
+        return (
+            list(Category.objects.order_by('slug').values_list('slug', 'name', 'available', 'popularity', 'description')),
+            list(Product.objects.order_by('slug').values_list('slug', 'name', 'category__slug', 'price', 'available')),
+            list(Service.objects.order_by('slug').values_list('slug', 'name', 'product__slug', 'price', 'popularity')),
+        )
+
+    def test_export_round_trip(self):
+        category = Category.objects.create(name='Сантехника', description='Трубы, "краны"\nи смесители', popularity=5)
+        product = Product.objects.create(category=category, name='Смеситель', price='1500.50', available=False)
+        Service.objects.create(product=product, name='Установка смесителя', price='800', popularity=3)
+        expected = self.catalog()
+        for fmt in ('csv', 'jsonl'):
+            with self.subTest(fmt=fmt):
+                output = io.StringIO()
+                call_command('catalog_export', format=fmt, stdout=output, stderr=io.StringIO())
+                Category.objects.all().delete()
+                self.run_import(output.getvalue(), fmt=fmt)
+                self.assertEqual(self.catalog(), expected)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LandingPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def make_category(self, name, popularities):
+        # Список категорий кэшируется в процессе до смены версии каталога, а она меняется после коммита
+        with self.captureOnCommitCallbacks(execute=True):
+            category = Category.objects.create(name=name)
+            for i, popularity in enumerate(popularities):
+                Product.objects.create(category=category, name=f'{name} {i}', price=100, popularity=popularity)
+        return category
+
+    def test_top_products_per_category(self):
+        plumbing = self.make_category('Сантехника', [5, 30, 10])
+        self.make_category('Электрика', [1])
+        Product.objects.create(category=plumbing, name='Снят с продажи', price=1, popularity=100, available=False)
+
+        top = {category.name: [p.name for p in category.top_products] for category in LandingView().get_categories_with_top_products()}
+        self.assertEqual(top, {'Сантехника': ['Сантехника 1', 'Сантехника 2'], 'Электрика': ['Электрика 0']})
+
+    def test_queries_do_not_grow_with_categories(self):
+        self.make_category('Сантехника', [1, 2, 3])
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/', {'nocache': 1})
+        for name in ('Электрика', 'Кровля', 'Окна', 'Двери'):
+            self.make_category(name, [1, 2, 3])
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/', {'nocache': 1})
+        self.assertContains(response, 'Двери 2')
+        self.assertEqual(len(many), len(few))
+
+    def test_cached_page_gets_visitor_csrf_token(self):
+        self.assertEqual(self.client.get('/').status_code, 200)
+        content, _ = cache.get(get_page_cache_key('/', 'landing'))
+        self.assertIn(b'__csrf_token_placeholder__', content)
+
+        visitor = Client(enforce_csrf_checks=True)
+        with self.assertNumQueries(0):
+            page = visitor.get('/').content.decode()
+        self.assertNotIn('__csrf_token_placeholder__', page)
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page).group(1)
+        # Токен из кэшированной страницы принимается при отправке формы
+        response = visitor.post('/order/create/', {'csrfmiddlewaretoken': token})
+        self.assertNotEqual(response.status_code, 403)
+        with self.assertLogs('django.security.csrf', 'WARNING'):
+            self.assertEqual(visitor.post('/order/create/', {}).status_code, 403)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name='Сантехника')
+            self.product = Product.objects.create(category=self.category, name='Смеситель', price=1500)
+        self.url = f'/{self.category.slug}/{self.product.slug}/'
+
+    def test_repeat_request_gets_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_change_invalidates_validators(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = 1700
+            self.product.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Новый товар меняет страницу категории
+        category_url = f'/{self.category.slug}/'
+        etag = self.client.get(category_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(category=self.category, name='Унитаз', price=9000)
+        self.assertEqual(self.client.get(category_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        etag = self.client.get(self.url)['ETag']
+        staff = get_user_model().objects.create_user('staff@example.com', 'Анна', 'Петрова', 'x', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_unavailable_product_has_no_validators(self):
+        Product.objects.filter(pk=self.product.pk).update(available=False)
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+
+class PhoneSearchTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(name='Иван', phone='+79123456789', city='Пермь')
+        self.other = Order.objects.create(name='Петр', phone='+79120008789', city='Пермь')
+
+    def search(self, query):
+        return set(Order.objects.filter(phone_search_q(query)).values_list('name', flat=True))
+
+    def test_start_of_number_in_any_notation(self):
+        for query in ('+7 912 345', '8 (912) 345', '912-345', '79123'):
+            self.assertEqual(self.search(query), {'Иван'}, query)
+        self.assertEqual(self.search('8912'), {'Иван', 'Петр'})
+
+    def test_end_of_number(self):
+        self.assertEqual(self.search('6789'), {'Иван'})
+        # Ведущая 8 заменяется на 7 только при поиске начала номера
+        self.assertEqual(self.search('8789'), {'Петр'})
+
+    def test_nothing_to_search(self):
+        self.assertEqual(self.search('555'), set())
+        self.assertEqual(self.search('Иван'), set())
+
+    def test_digits_follow_phone_changes(self):
+        self.order.phone = '+79990001122'
+        self.order.save(update_fields=['phone'])
+        self.assertEqual(self.search('999 000'), {'Иван'})
+        self.assertEqual(self.search('1122'), {'Иван'})
+        self.assertEqual(self.search('912 345'), set())
+
+
+class CoverageTests(TestCase):
+    def setUp(self):
+        self.plumbing = Category.objects.create(name='Сантехника')
+        self.heating = Category.objects.create(name='Отопление')
+        self.plumber = Specialization.objects.create(name='Сантехник')
+        self.welder = Specialization.objects.create(name='Сварщик')
+        self.employee = make_employee()
+        self.employee.specialization.add(self.plumber)
+
+    def covered(self, category):
+        return list(covering_employees([category.pk]))
+
+    def assertCoverageConsistent(self):
+        self.assertEqual(diff_coverage(), (set(), []))
+
+    def test_set_specializations_updates_coverage(self):
+        self.plumbing.set_specializations([self.plumber, self.welder])
+        self.assertEqual(set(self.plumbing.specialization_set.all()), {self.plumber, self.welder})
+        self.assertEqual(self.covered(self.plumbing), [self.employee])
+        self.assertCoverageConsistent()
+
+        self.plumbing.set_specializations([self.welder])
+        self.assertEqual(self.covered(self.plumbing), [])
+        self.assertCoverageConsistent()
+
+    def test_unchanged_specializations_cost_one_query(self):
+        self.plumbing.set_specializations([self.plumber])
+        with self.assertNumQueries(1):
+            self.plumbing.set_specializations([self.plumber])
+
+    def test_direct_and_specialization_coverage_are_independent(self):
+        self.heating.set_specializations([self.plumber])
+        self.employee.categories.add(self.heating)
+        self.employee.specialization.remove(self.plumber)
+        self.assertEqual(self.covered(self.heating), [self.employee])
+        self.employee.categories.clear()
+        self.assertEqual(self.covered(self.heating), [])
+        self.assertCoverageConsistent()
+
+    def test_category_form_saves_specializations(self):
+        use_temp_media_root(self)
+        form = CategoryForm(
+            {'name': 'Сантехника', 'available': True, 'specializations': [self.plumber.pk]},
+            {'image': make_image('santehnika.jpg')},
+            instance=self.plumbing,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        with mock.patch('main.signals.schedule_derivatives'):
+            form.save()
+        self.assertEqual(self.covered(self.plumbing), [self.employee])
+        self.assertCoverageConsistent()
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        staff = get_user_model().objects.create_user('staff@example.com', 'Анна', 'Петрова', 'x', is_staff=True)
+        self.client.force_login(staff)
+        self.category = Category.objects.create(name='Сантехника')
+        self.employee = make_employee()
+
+    def make_order(self, **kwargs):
+        values = {'name': 'Иван', 'phone': '+79123456789', 'city': 'Пермь', 'status': 'confirmed'}
+        values.update(kwargs)
+        order = Order.objects.create(**values)
+        order.categories.add(self.category)
+        order.assigned_employees.add(self.employee)
+        return order
+
+    def export(self, **params):
+        response = self.client.get('/dashboard/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:]), delimiter=';'))
+
+    def test_rows_and_filters(self):
+        order = self.make_order(comment='Позвонить заранее')
+        self.make_order(status='spam')
+        header, *rows = self.export(status='confirmed')
+        self.assertEqual(len(rows), 1)
+        row = dict(zip(header, rows[0]))
+        self.assertEqual(row['Номер'], str(order.pk))
+        self.assertEqual(row['Телефон'], '+79123456789')
+        self.assertEqual(row['Категории'], 'Сантехника')
+        self.assertEqual(row['Мастера'], 'Петр Иванов')
+        self.assertEqual(row['Комментарий'], 'Позвонить заранее')
+
+    def test_formulas_are_neutralised(self):
+        self.make_order(name='=HYPERLINK("http://example.com")', comment='+1 и -2', work_description='@SUM(A1)')
+        header, row = self.export()
+        row = dict(zip(header, row))
+        self.assertEqual(row['Клиент'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(row['Комментарий'], "'+1 и -2")
+        self.assertEqual(row['Описание работ'], "'@SUM(A1)")
+        self.assertEqual(row['Телефон'], '+79123456789')
+
+    def test_queries_do_not_grow_with_orders(self):
+        self.make_order()
+        with CaptureQueriesContext(connection) as one:
+            self.export()
+        for _ in range(5):
+            self.make_order()
+        with CaptureQueriesContext(connection) as six:
+            self.assertEqual(len(self.export()), 7)
+        self.assertEqual(len(six), len(one))
+
+
+class WorkloadCounterTests(TestCase):
+    def setUp(self):
+        self.first = make_employee(phone='+79001234561')
+        self.second = make_employee(phone='+79001234562')
+
+    def counters(self, employee):
+        employee.refresh_from_db()
+        return employee.open_orders_count, employee.in_progress_orders_count, employee.completed_recent_count
+
+    def make_order(self, status='new', employees=()):
+        order = Order.objects.create(name='Иван', phone='+79123456789', city='Пермь', status=status)
+        order.assigned_employees.add(*employees)
+        return order
+
+    def test_counters_follow_orders(self):
+        order = self.make_order('confirmed', [self.first, self.second])
+        self.make_order('new', [self.first])
+        self.assertEqual(self.counters(self.first), (1, 0, 0))
+
+        order.status = 'in_work'
+        order.save()
+        self.assertEqual(self.counters(self.second), (0, 1, 0))
+
+        order.assigned_employees.remove(self.second)
+        self.assertEqual(self.counters(self.second), (0, 0, 0))
+
+        order.status = 'completed'
+        order.save()
+        self.assertEqual(self.counters(self.first), (0, 0, 1))
+
+        # Назначение со стороны мастера
+        self.second.order_set.add(order)
+        self.assertEqual(self.counters(self.second), (0, 0, 1))
+
+        order.assigned_employees.clear()
+        self.assertEqual(self.counters(self.first), (0, 0, 0))
+        self.assertEqual(recount_workload(dry_run=True), [])
+
+    def test_old_completed_order_is_not_recent(self):
+        order = self.make_order('completed', [self.first])
+        self.assertEqual(self.counters(self.first), (0, 0, 1))
+        Order.objects.filter(pk=order.pk).update(date_completed=timezone.now() - timedelta(days=31))
+        # Заказ вышел из окна "недавних" - это правит ежедневный пересчет
+        self.assertEqual([employee.pk for employee in recount_workload()], [self.first.pk])
+        self.assertEqual(self.counters(self.first), (0, 0, 0))
+
+    def test_status_save_touches_only_assigned_masters(self):
+        order = self.make_order('confirmed', [self.first])
+        order = Order.objects.get(pk=order.pk)
+        order.status = 'in_work'
+        with CaptureQueriesContext(connection) as queries:
+            order.save()
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "main_employee"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.counters(self.first), (0, 1, 0))
+        self.assertEqual(self.counters(self.second), (0, 0, 0))
+
+
+class BulkStatusTests(TestCase):
+    def setUp(self):
+        self.employee = make_employee()
+
+    def make_orders(self, n, status='new'):
+        orders = [Order.objects.create(name='Иван', phone='+79123456789', city='Пермь', status=status) for _ in range(n)]
+        for order in orders:
+            order.assigned_employees.add(self.employee)
+        return [order.pk for order in orders]
+
+    def test_orders_counters_and_rollups_follow(self):
+        confirmed = self.make_orders(3, 'confirmed')
+        done = self.make_orders(1, 'completed')
+        self.assertEqual(set_order_status(confirmed + done, 'completed'), 3)
+
+        self.employee.refresh_from_db()
+        self.assertEqual((self.employee.open_orders_count, self.employee.completed_recent_count), (0, 4))
+        self.assertFalse(Order.objects.filter(status='completed', date_completed__isnull=True).exists())
+        self.assertEqual(recount_workload(dry_run=True), [])
+        self.assertFalse(any(rebuild_rollups(dry_run=True).values()))
+
+        self.assertEqual(set_order_status(confirmed, 'spam'), 3)
+        self.assertFalse(Order.objects.filter(status='spam', date_completed__isnull=False).exists())
+        self.assertFalse(any(rebuild_rollups(dry_run=True).values()))
+
+    def test_queries_do_not_grow_with_selection(self):
+        few, many = self.make_orders(2), self.make_orders(20)
+        # Первый перевод создает строку сводки за день - дальше только UPDATE
+        set_order_status(self.make_orders(1), 'confirmed')
+        with CaptureQueriesContext(connection) as first:
+            set_order_status(few, 'confirmed')
+        with CaptureQueriesContext(connection) as second:
+            set_order_status(many, 'confirmed')
+        self.assertEqual(len(second), len(first))
+
+    def test_view_applies_status_and_returns_to_list(self):
+        staff = get_user_model().objects.create_user('staff@example.com', 'Анна', 'Петрова', 'x', is_staff=True)
+        self.client.force_login(staff)
+        application = JobApplication.objects.create(
+            first_name='Анна', last_name='Ли', phone='+79123456780', age=30, city='Пермь', specialization='Сантехник',
+        )
+        response = self.client.post('/dashboard/job_applications/status/', {
+            'ids': [application.pk], 'status': 'spam', 'next': '/dashboard/job_applications/?status=new',
+        })
+        self.assertRedirects(response, '/dashboard/job_applications/?status=new', fetch_redirect_response=False)
+        application.refresh_from_db()
+        self.assertEqual(application.status, 'spam')
+
+        response = self.client.post('/dashboard/orders/status/', {'ids': ['x'], 'status': 'spam', 'next': 'https://evil.example/'})
+        self.assertRedirects(response, '/dashboard/orders/', fetch_redirect_response=False)
+
+
+class RollupTests(TestCase):
+    def make_order(self, status='new'):
+        return Order.objects.create(name='Иван', phone='+79123456789', city='Пермь', status=status)
+
+    def test_order_rows_and_conversion(self):
+        order = self.make_order('confirmed')
+        self.make_order('new')
+        self.make_order('spam')
+        order.status = 'completed'
+        order.save()
+
+        stats = dashboard_stats(7)
+        today = stats['order_rows'][0]
+        self.assertEqual(today['day'], timezone.localdate())
+        self.assertEqual(today['total'], 3)
+        self.assertEqual((stats['orders_total'], stats['orders_completed']), (3, 1))
+        # Спам в конверсию не входит: 1 выполненный из 2
+        self.assertEqual(stats['conversion'], 50.0)
+        self.assertEqual(len(stats['order_rows']), 7)
+
+    def test_period_and_deletion(self):
+        self.make_order()
+        old = Order.objects.get(pk=self.make_order().pk)
+        # Дата создания поменялась в обход сигналов - сводку исправляет пересчет
+        Order.objects.filter(pk=old.pk).update(date_created=timezone.now() - timedelta(days=40))
+        self.assertEqual(rebuild_rollups()[OrderDailyStat], 2)
+        self.assertEqual(dashboard_stats(30)['orders_total'], 1)
+        self.assertEqual(dashboard_stats(90)['orders_total'], 2)
+
+        Order.objects.get(pk=old.pk).delete()
+        self.assertEqual(dashboard_stats(90)['orders_total'], 1)
+        self.assertFalse(any(rebuild_rollups(dry_run=True).values()))
+
+    def test_applications_and_masters(self):
+        for specialization in ('Сантехник', 'Сантехник', 'Электрик'):
+            JobApplication.objects.create(
+                first_name='Анна', last_name='Ли', phone='+79123456780', age=30, city='Пермь', specialization=specialization,
+            )
+        make_employee(city='Екатеринбург', phone='+79001234561')
+        make_employee(city=' екатеринбург ', phone='+79001234562')
+        make_employee(city='Пермь', phone='+79001234563', status='part_time')
+        away = make_employee(city='Пермь', phone='+79001234564')
+        away.available = False
+        away.save()
+        moved = make_employee(city='Пермь', phone='+79001234565')
+        moved.city = 'Екатеринбург'
+        moved.save()
+
+        stats = dashboard_stats(7)
+        self.assertEqual([(row['specialization'], row['total']) for row in stats['applications']], [('Сантехник', 2), ('Электрик', 1)])
+        self.assertEqual(
+            list(CityMasterStat.objects.filter(count__gt=0).order_by('city').values_list('city', 'count')),
+            [('екатеринбург', 3), ('пермь', 1)],
+        )
+        self.assertEqual(stats['masters_total'], 4)
+        self.assertFalse(any(rebuild_rollups(dry_run=True).values()))
+
+    def test_dashboard_reads_only_rollups(self):
+        staff = get_user_model().objects.create_user('staff@example.com', 'Анна', 'Петрова', 'x', is_staff=True)
+        self.client.force_login(staff)
+        self.make_order()
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.client.get('/dashboard/', {'days': 90}).status_code, 200)
+        for _ in range(10):
+            self.make_order('completed')
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get('/dashboard/', {'days': 90})
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(any('"main_order"' in q['sql'] for q in many.captured_queries))
+        self.assertEqual(response.context['orders_total'], 11)
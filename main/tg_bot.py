@@ -1,14 +1,95 @@
-import telegram
+import asyncio
 import logging
+import threading
+import time
+
+import telegram
+from telegram.request import HTTPXRequest
 
 
 logging.basicConfig(level=logging.INFO)
 
-async def send_tg_message(token, chat_id, message, parse_mode='Markdown'):
-    try:
-        bot = telegram.Bot(token=token)
-        await bot.send_message(chat_id=chat_id, text=message, parse_mode=parse_mode)
-        logging.info(f'Соощбшение "{message}" отправлено в чат {chat_id}')
-    except Exception as e:
-        logging.error(f'Ошибка при отправке сообщения: {e}')
-        raise
+
+class TokenBucket:
+    """Ограничитель частоты: не больше capacity сообщений подряд, далее rate сообщений в секунду"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def wait_time(self):
+        """Сколько секунд ждать до следующего свободного токена"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        while not self.try_acquire():
+            time.sleep(self.wait_time())
+
+
+class TelegramSender:
+    """Долгоживущий отправитель: один Bot с пулом соединений и свой цикл событий.
+
+    Лимиты Telegram: около 1 сообщения в секунду в один чат (короткие всплески допустимы)
+    и около 30 сообщений в секунду на бота в целом.
+    """
+
+    def __init__(self, token, chat_rate=1.0, chat_burst=3, global_rate=30.0, pool_size=4):
+        self.token = token
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.pool_size = pool_size
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._bot = None
+        self._loop = None
+
+    def bucket(self, chat_id):
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return self._chat_buckets[chat_id]
+
+    def _run(self, coroutine):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coroutine)
+
+    def _get_bot(self):
+        if self._bot is None:
+            request = HTTPXRequest(connection_pool_size=self.pool_size)
+            self._bot = telegram.Bot(token=self.token, request=request)
+            self._run(self._bot.initialize())
+        return self._bot
+
+    def send(self, chat_id, message, parse_mode='Markdown'):
+        """Отправляет сообщение, дожидаясь свободного места в лимитах чата и бота"""
+        self.bucket(chat_id).acquire()
+        self.global_bucket.acquire()
+        bot = self._get_bot()
+        self._run(bot.send_message(chat_id=chat_id, text=message, parse_mode=parse_mode))
+        logging.info(f'Сообщение отправлено в чат {chat_id}')
+
+    def close(self):
+        if self._bot is not None:
+            self._run(self._bot.shutdown())
+            self._bot = None
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
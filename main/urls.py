@@ -12,23 +12,20 @@ urlpatterns = [
 
     # Управление
     path('dashboard/', views.DashboardView.as_view(), name='employee_dashboard'),
+    path('dashboard/search/', views.SearchView.as_view(), name='search'),
     path('dashboard/all-items/', views.AllItemsListView.as_view(), name='all_items_list'),
         # Заказы
     path('dashboard/orders/', views.OrderListView.as_view(), name='order_list'),
+    path('dashboard/orders/export/', views.OrderExportView.as_view(), name='order_export'),
+    path('dashboard/orders/status/', views.OrderBulkStatusView.as_view(), name='order_bulk_status'),
     path('dashboard/order/<int:pk>/', views.OrderDetailView.as_view(), name='order_detail'),
     path('dashboard/order/<int:pk>/edit/', views.OrderEditView.as_view(), name='order_edit'),
     path('dashboard/order/create/', views.OrderCreateAdminView.as_view(), name='order_create_admin'),
-    path('ajax/get-products-by-category/', views.get_products_by_category, name='get_products_by_category'),
-    path('ajax/get-employees-by-category/', views.get_employees_by_category, name='get_employees_by_category'),
-    path('ajax/get-products-by-specialization/', views.get_products_by_specialization, name='get_products_by_specialization'),
-    path('ajax/get-categories-by-specialization/', views.get_categories_by_specialization, name='get_categories_by_specialization'),
-    path('ajax/get-services-by-products/', views.get_services_by_products, name='get_services_by_products'),
-    path('ajax/get-products-by-categories/', views.get_products_by_categories, name='get_products_by_categories'),
-    path('ajax/get-employees-by-categories/', views.get_employees_by_categories, name='get_employees_by_categories'),
-    path('ajax/get-products-by-categories/', views.get_products_by_categories, name='get_products_by_categories'),
-    path('ajax/get-employees-by-categories/', views.get_employees_by_categories, name='get_employees_by_categories'),
+    path('ajax/options/', views.get_options, name='get_options'),
+    path('ajax/catalog-graph/<str:version>/', views.get_catalog_graph_snapshot, name='catalog_graph'),
         # Резюме
     path('dashboard/job_applications/', views.JobApplicationListView.as_view(), name='job_application_list'),
+    path('dashboard/job_applications/status/', views.JobApplicationBulkStatusView.as_view(), name='job_application_bulk_status'),
     path('dashboard/job_application/<int:pk>/', views.JobApplicationDetailView.as_view(), name='job_application_detail'),
         # Сотрудники
     path('dashboard/specialization/create/', views.SpecializationCreateView.as_view(), name='specialization_create'),
@@ -1,17 +1,35 @@
 from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView, View
 from django.shortcuts import get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.response import TemplateResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag, url_has_allowed_host_and_scheme
 from django.template.loader import render_to_string
-from django.db.models import Q
-from django.db import models
+from django.db.models import Q, F, Window, Max, Count, Prefetch
+from django.db.models.functions import RowNumber
+from django.db import models, transaction
 from django.urls import reverse_lazy
+from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth.mixins import UserPassesTestMixin
 
-from datetime import date
+import csv
+import hashlib
+from collections import defaultdict
+from copy import copy
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
-from .models import Category, Product, Service, Order, JobApplication, Employee, Specialization, OrderImage
+from .models import Category, Product, Service, Order, JobApplication, Employee, Specialization, OrderImage, phone_search_q
+from .search import KINDS, SearchResults, search_q, substring_q
+from .recommendations import master_index
 from .forms import OrderForm, JobApplicationForm, EmployeeForm, CategoryForm, ProductForm, ServiceForm, SpecializationForm, OrderEditForm
+from .popularity import popularity_buffer
+from .images import schedule_order_photos
+from .bulk_status import BULK_STATUS_SETTERS
+from .rollups import dashboard_stats
+from .cache import get_available_categories, get_catalog_version, get_catalog_graph, get_catalog_graph_version, get_masters_version, get_page_cache_key, get_section_version, PAGE_CACHE_TIMEOUT, CSRF_TOKEN_PLACEHOLDER
 
 # Миксин для проверки принадлежности к сотрудникам
 class StaffRequiredMixin(UserPassesTestMixin):
@@ -23,18 +41,111 @@ class StaffRequiredMixin(UserPassesTestMixin):
         return redirect("main:landing")
 
 
-class LandingView(TemplateView):
+# Миксин полностраничного кэша для анонимных посетителей
+class PublicPageCacheMixin:
+    page_cache_section = None
+    # pk объекта страницы; заполняет get_validator_parts, когда объект найден
+    page_object_pk = None
+
+    def get_page_cache_section(self):
+        return self.page_cache_section
+
+    def record_page_hit(self, pk):
+        """Учитывает просмотр объекта pk, в том числе страницы, отданной из кэша или ответом 304"""
+
+    def get_validator_parts(self):
+        """Дешевые данные для ETag/Last-Modified: (список частей ETag, datetime) или None"""
+        return None
+
+    def get_validators(self):
+        parts = self.get_validator_parts()
+        if parts is None:
+            return None
+        etag_parts, last_modified = parts
+        # Версия каталога (меню категорий), раздела (готовые копии изображений) и пользователь (шапка)
+        # тоже влияют на страницу
+        section_version = get_section_version(self.get_page_cache_section())
+        raw = ":".join(str(part) for part in (*etag_parts, get_catalog_version(), section_version, self.request.user.pk))
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        return etag, int(last_modified.timestamp())
+
+    def dispatch(self, request, *args, **kwargs):
+        self.kwargs = kwargs
+        validators = self.get_validators() if request.method in ('GET', 'HEAD') else None
+        # Несуществующий адрес (404) в популярность не попадает
+        if request.method == 'GET' and self.page_object_pk is not None:
+            self.record_page_hit(self.page_object_pk)
+        if validators is not None:
+            etag, last_modified = validators
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+
+        response = self.dispatch_cached(request, *args, **kwargs)
+        if validators is not None and response.status_code == 200:
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+        return response
+
+    def dispatch_cached(self, request, *args, **kwargs):
+        if request.method != 'GET' or request.GET or request.user.is_authenticated:
+            return super().dispatch(request, *args, **kwargs)
+
+        cache_key = get_page_cache_key(request.path, self.get_page_cache_section())
+        cached = cache.get(cache_key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(self._punch_csrf_token(request, content), content_type=content_type)
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response, TemplateResponse):
+            # В кэш попадает страница с заглушкой вместо CSRF-токена конкретного посетителя
+            response.context_data['csrf_token'] = CSRF_TOKEN_PLACEHOLDER
+            response.render()
+            cache.set(cache_key, (response.content, response['Content-Type']), PAGE_CACHE_TIMEOUT)
+            response.content = self._punch_csrf_token(request, response.content)
+        return response
+
+    @staticmethod
+    def _punch_csrf_token(request, content):
+        return content.replace(CSRF_TOKEN_PLACEHOLDER.encode(), get_token(request).encode())
+
+
+class LandingView(PublicPageCacheMixin, TemplateView):
     template_name = "main/landing.html"
+    page_cache_section = "landing"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["title"] = "АльянсМастер - ПОМОЩЬ РЯДОМ"
-        context["categories"] = Category.objects.filter(available=True)
+        context["categories"] = self.get_categories_with_top_products()
         context["order_from"] = OrderForm()
         return context
 
+    def get_categories_with_top_products(self, limit=2):
+        """Категории с самыми популярными товарами, выбранными одним оконным запросом"""
+        categories = get_available_categories()
+        top_products = (
+            Product.objects.filter(category__in=[category.id for category in categories], available=True)
+            .annotate(rank=Window(RowNumber(), partition_by=F("category_id"), order_by=[F("popularity").desc(), F("name")]))
+            .filter(rank__lte=limit)
+            .order_by("category_id", "rank")
+            .only("id", "name", "category_id", "popularity")
+        )
+        products_by_category = defaultdict(list)
+        for product in top_products:
+            products_by_category[product.category_id].append(product)
+
+        # Копируем категории, чтобы не менять объекты из общего кэша процесса
+        result = []
+        for category in categories:
+            category = copy(category)
+            category.top_products = products_by_category[category.id]
+            result.append(category)
+        return result
+
 
-class AboutView(TemplateView):
+class AboutView(PublicPageCacheMixin, TemplateView):
     template_name = "main/about_us.html"
 
     def get_context_data(self, **kwargs):
@@ -43,7 +154,7 @@ class AboutView(TemplateView):
         context["title"] = "О компании АльянсМастер"
         return context
 
-class JobApplicationView(TemplateView):
+class JobApplicationView(PublicPageCacheMixin, TemplateView):
     template_name = "main/job_application/job_application.html"
 
     def get_context_data(self, **kwargs):
@@ -53,12 +164,20 @@ class JobApplicationView(TemplateView):
         return context
     
 
+# Периоды панели управления, дней
+DASHBOARD_PERIODS = (7, 30, 90)
+
+
 class DashboardView(StaffRequiredMixin, TemplateView):
     template_name = "main/private/dashboard.html"
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["title"] = "Панель сотрудника"
+        days = self.request.GET.get("days", "")
+        days = int(days) if days.isdigit() and int(days) in DASHBOARD_PERIODS else DASHBOARD_PERIODS[1]
+        context.update(dashboard_stats(days))
+        context["periods"] = DASHBOARD_PERIODS
         return context
 
 class CategoryListView(StaffRequiredMixin, ListView):
@@ -71,7 +190,7 @@ class CategoryListView(StaffRequiredMixin, ListView):
         
         search = self.request.GET.get('search')
         if search:
-            queryset = queryset.filter(name__icontains=search)
+            queryset = queryset.filter(search_q(search, 'category') | substring_q(search, 'name'))
             
         available = self.request.GET.get('available')
         if available == 'true':
@@ -119,11 +238,33 @@ class CategoryUpdateView(StaffRequiredMixin, UpdateView):
     template_name = "main/private/category/category_form.html"
     success_url = reverse_lazy("main:category_list")
 
-class ProductListByCategory(ListView):
+class ProductListByCategory(PublicPageCacheMixin, ListView):
     model = Product
     template_name = "main/product/product_list.html"
     context_object_name = "products"
 
+    def get_page_cache_section(self):
+        return self.kwargs["category_slug"]
+
+    def record_page_hit(self, pk):
+        popularity_buffer.add(Category, "pk", pk)
+
+    def get_validator_parts(self):
+        row = (
+            Category.objects.filter(slug=self.kwargs["category_slug"])
+            .annotate(
+                products_updated=Max("products__date_updated"),
+                products_count=Count("products", filter=Q(products__available=True)),
+            )
+            .values_list("pk", "date_updated", "products_updated", "products_count")
+            .first()
+        )
+        if row is None:
+            return None
+        self.page_object_pk, category_updated, products_updated, products_count = row
+        last_modified = max(filter(None, (category_updated, products_updated)))
+        return (category_updated, products_updated, products_count), last_modified
+
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs["category_slug"])
         return Product.objects.filter(category=self.category, available=True)
@@ -135,11 +276,34 @@ class ProductListByCategory(ListView):
         context["title"] = f"{self.category.name} — АльянсМастер"
         return context
 
-class ProductDetailView(DetailView):
+class ProductDetailView(PublicPageCacheMixin, DetailView):
     model = Product
     template_name = "main/product/product_detail.html"
     context_object_name = "product"
 
+    def get_page_cache_section(self):
+        return self.kwargs["category_slug"]
+
+    def record_page_hit(self, pk):
+        popularity_buffer.add(Product, "pk", pk)
+
+    def get_validator_parts(self):
+        row = (
+            Product.objects.filter(
+                category__slug=self.kwargs["category_slug"],
+                slug=self.kwargs["product_slug"],
+                available=True,
+            )
+            .annotate(services_updated=Max("services__date_updated"), services_count=Count("services"))
+            .values_list("pk", "date_updated", "category__date_updated", "services_updated", "services_count")
+            .first()
+        )
+        if row is None:
+            return None
+        self.page_object_pk, *row = row
+        last_modified = max(filter(None, row[:3]))
+        return row, last_modified
+
     def get_object(self, queryset=None):
         if queryset is None:
             queryset = self.get_queryset()
@@ -323,11 +487,10 @@ class EmployeeListView(StaffRequiredMixin, ListView):
         search = self.request.GET.get('search')
         if search:
             queryset = queryset.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(phone__icontains=search) |
-                Q(city__icontains=search) |
-                Q(specialization__name__icontains=search)
+                search_q(search, 'employee') |
+                substring_q(search, 'first_name', 'last_name', 'city') |
+                Q(pk__in=Employee.objects.filter(specialization__name__icontains=search).values('pk')) |
+                phone_search_q(search)
             )
         
         status = self.request.GET.get('status')
@@ -440,33 +603,217 @@ class OrderCreateView(CreateView):
         messages.error(self.request, 'Пожалуйста, исправьте ошибки в форме.')
         return super().form_invalid(form)
 
-class OrderListView(StaffRequiredMixin, ListView):
+def save_order_images(order, files):
+    """Сохраняет фото заказа одним INSERT, пережатие и миниатюры делаются в фоне"""
+    if not files:
+        return
+    images = OrderImage.objects.bulk_create([OrderImage(order=order, image=file) for file in files])
+    transaction.on_commit(lambda: schedule_order_photos(images))
+
+# Миксин постраничного вывода по ключу (date_created, id) вместо OFFSET
+class KeysetPaginationMixin:
+    paginate_by = 30
+    keyset_field = 'date_created'
+
+    @staticmethod
+    def encode_cursor(value, pk):
+        micros = (value - datetime(1970, 1, 1, tzinfo=dt_timezone.utc)) // timedelta(microseconds=1)
+        return f"{micros}-{pk}"
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            micros, pk = cursor.split('-')
+            return datetime(1970, 1, 1, tzinfo=dt_timezone.utc) + timedelta(microseconds=int(micros)), int(pk)
+        except (AttributeError, ValueError, OverflowError):
+            return None
+
+    def paginate_queryset(self, queryset, page_size):
+        field = self.keyset_field
+        after = self.decode_cursor(self.request.GET.get('after'))
+        before = self.decode_cursor(self.request.GET.get('before'))
+
+        if before:
+            value, pk = before
+            queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+            items = list(queryset.order_by(field, 'id')[:page_size + 1])
+            has_previous, has_next = len(items) > page_size, True
+            items = items[:page_size][::-1]
+        else:
+            if after:
+                value, pk = after
+                queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+            items = list(queryset.order_by(f'-{field}', '-id')[:page_size + 1])
+            has_previous, has_next = bool(after), len(items) > page_size
+            items = items[:page_size]
+
+        page = {
+            'has_next': has_next and bool(items),
+            'has_previous': has_previous and bool(items),
+            'next_cursor': self.encode_cursor(getattr(items[-1], field), items[-1].pk) if items else None,
+            'previous_cursor': self.encode_cursor(getattr(items[0], field), items[0].pk) if items else None,
+        }
+
+        # Текущие фильтры для ссылок на соседние страницы
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        page['query'] = query.urlencode()
+        return None, page, items, page['has_next'] or page['has_previous']
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def filter_orders(queryset, params):
+    """Фильтры списка заказов: статус, период создания (date_from, date_to включительно) и поиск"""
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+
+    # Границы периода - начало суток в часовом поясе сайта, чтобы работал индекс по date_created
+    date_from, date_to = _parse_date(params.get('date_from')), _parse_date(params.get('date_to'))
+    if date_from:
+        queryset = queryset.filter(date_created__gte=timezone.make_aware(datetime.combine(date_from, datetime.min.time())))
+    if date_to:
+        queryset = queryset.filter(date_created__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), datetime.min.time())))
+
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(search_q(search, 'order') | substring_q(search, 'name', 'city') | phone_search_q(search))
+    return queryset
+
+
+def prefetch_order_relations(queryset):
+    return queryset.prefetch_related(
+        Prefetch('categories', queryset=Category.objects.only('id', 'name')),
+        Prefetch('products', queryset=Product.objects.only('id', 'name')),
+        Prefetch('assigned_employees', queryset=Employee.objects.only('id', 'first_name', 'last_name')),
+    )
+
+
+class OrderListView(StaffRequiredMixin, KeysetPaginationMixin, ListView):
     model = Order
     template_name = "main/private/order/order_list.html"
     context_object_name = "orders"
     
     def get_queryset(self):
-        queryset = Order.objects.all().order_by('-date_created')
-        
-        status = self.request.GET.get('status')
-        if status:
-            queryset = queryset.filter(status=status)
-            
-        search = self.request.GET.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(phone__icontains=search) |
-                Q(city__icontains=search)
-            )
-            
-        return queryset
+        return filter_orders(prefetch_order_relations(Order.objects.all()), self.request.GET)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['status_choices'] = Order.STATUS_CHOICES
+        # Те же фильтры для выгрузки в CSV
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        context['export_query'] = query.urlencode()
         return context
 
+
+class BulkStatusView(StaffRequiredMixin, View):
+    """Смена статуса у выбранных в списке заказов или анкет одним запросом к базе (например, волна спама)"""
+    model = None
+    success_url = None
+
+    def post(self, request, *args, **kwargs):
+        status = request.POST.get('status')
+        try:
+            ids = [int(pk) for pk in request.POST.getlist('ids')]
+        except ValueError:
+            ids = []
+
+        statuses = dict(self.model.STATUS_CHOICES)
+        if status not in statuses or not ids:
+            messages.error(request, 'Выберите записи и новый статус.')
+        else:
+            changed = BULK_STATUS_SETTERS[self.model](ids, status)
+            messages.success(request, f'Статус «{statuses[status]}» установлен: {changed} из {len(ids)}.')
+
+        # Возвращаемся в список с теми же фильтрами
+        next_url = request.POST.get('next')
+        if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+            next_url = self.success_url
+        return redirect(next_url)
+
+
+class OrderBulkStatusView(BulkStatusView):
+    model = Order
+    success_url = reverse_lazy('main:order_list')
+
+
+class JobApplicationBulkStatusView(BulkStatusView):
+    model = JobApplication
+    success_url = reverse_lazy('main:job_application_list')
+
+
+class Echo:
+    """Файл, который просто возвращает записанное: csv.writer пишет в него строку, а мы отдаем ее клиенту"""
+
+    def write(self, value):
+        return value
+
+
+class OrderExportView(StaffRequiredMixin, View):
+    """Выгрузка отфильтрованных заказов в CSV для бухгалтерии.
+
+    Ответ потоковый: заказы читаются из базы пачками по chunk_size, связи
+    подгружаются отдельными запросами на каждую пачку, поэтому память не растет
+    с размером выгрузки. Разделитель ";" и BOM - чтобы файл сразу открывался в Excel.
+    """
+    chunk_size = 500
+    columns = [
+        'Номер', 'Дата создания', 'Статус', 'Клиент', 'Телефон', 'Адрес', 'Категории', 'Товары',
+        'Мастера', 'Описание работ', 'Комментарий', 'Дата выполнения', 'Создан клиентом',
+    ]
+
+    def get(self, request, *args, **kwargs):
+        queryset = filter_orders(prefetch_order_relations(Order.objects.all()), request.GET).order_by('-date_created', '-id')
+        response = StreamingHttpResponse(self.stream(queryset), content_type='text/csv; charset=utf-8')
+        filename = f'orders_{timezone.localdate():%Y-%m-%d}.csv'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def stream(self, queryset):
+        writer = csv.writer(Echo(), delimiter=';')
+        yield '\ufeff' + writer.writerow(self.columns)
+        for order in queryset.iterator(chunk_size=self.chunk_size):
+            yield writer.writerow(self.get_row(order))
+
+    # С этих символов Excel начинает формулу
+    formula_prefixes = ('=', '+', '-', '@', '\t', '\r')
+
+    @staticmethod
+    def format_datetime(value):
+        return timezone.localtime(value).strftime('%d.%m.%Y %H:%M') if value else ''
+
+    @classmethod
+    def text(cls, value):
+        """Введенный пользователем текст: ведущий апостроф не дает Excel выполнить его как формулу"""
+        value = value or ''
+        return f"'{value}" if value.startswith(cls.formula_prefixes) else value
+
+    def get_row(self, order):
+        return [
+            order.pk,
+            self.format_datetime(order.date_created),
+            order.get_status_display(),
+            self.text(order.get_display_name()),
+            order.phone,
+            self.text(order.get_display_address()),
+            self.text(', '.join(category.name for category in order.categories.all())),
+            self.text(', '.join(product.name for product in order.products.all())),
+            self.text(', '.join(f'{employee.first_name} {employee.last_name}' for employee in order.assigned_employees.all())),
+            self.text(order.work_description),
+            self.text(order.comment),
+            self.format_datetime(order.date_completed),
+            'да' if order.created_by_client else 'нет',
+        ]
+
 class OrderDetailView(StaffRequiredMixin, DetailView):
     model = Order
     template_name = "main/private/order/order_detail.html"
@@ -478,7 +825,9 @@ class OrderDetailView(StaffRequiredMixin, DetailView):
         
         if new_status in dict(Order.STATUS_CHOICES):
             order.status = new_status
-            order.save()
+            # Счетчики загрузки назначенных мастеров меняются сигналами в той же транзакции
+            with transaction.atomic():
+                order.save(update_fields=['status'])
             
         return JsonResponse({
             'success': True,
@@ -508,9 +857,7 @@ class OrderEditView(StaffRequiredMixin, UpdateView):
         response = super().form_valid(form)
         
         # Обработка множественных изображений
-        files = self.request.FILES.getlist('additional_images')
-        for file in files:
-            OrderImage.objects.create(order=self.object, image=file)
+        save_order_images(self.object, self.request.FILES.getlist('additional_images'))
         
         messages.success(self.request, 'Информация о заказе успешно обновлена.')
         return response
@@ -531,125 +878,87 @@ class OrderCreateAdminView(StaffRequiredMixin, CreateView):
     def form_valid(self, form):
         response = super().form_valid(form)
         
-        files = self.request.FILES.getlist('additional_images')
-        for file in files:
-            OrderImage.objects.create(order=self.object, image=file)
+        save_order_images(self.object, self.request.FILES.getlist('additional_images'))
         
         messages.success(self.request, 'Заявка успешно создана.')
         return response
 
 
-def get_products_by_category(request):
-    if not (request.user.is_authenticated and request.user.is_staff):
-        return JsonResponse({'products': []})
-        
-    category_id = request.GET.get('category_id')
-    if category_id:
-        products = Product.objects.filter(category_id=category_id, available=True).values('id', 'name')
-        return JsonResponse({'products': list(products)})
-    return JsonResponse({'products': []})
+def _get_ids(request, name):
+    return sorted({int(pk) for pk in request.GET.getlist(f'{name}[]')})
 
-def get_employees_by_category(request):
-    if not (request.user.is_authenticated and request.user.is_staff):
-        return JsonResponse({'employees': []})
-        
-    category_id = request.GET.get('category_id')
-    if category_id:
-        employees = Employee.objects.filter(
-            categories=category_id, 
-            available=True, 
-            status='active'
-        ).values('id', 'first_name', 'last_name')
-        
-        # Формируем полное имя
-        employees_list = []
-        for emp in employees:
-            employees_list.append({
-                'id': emp['id'],
-                'name': f"{emp['first_name']} {emp['last_name']}"
-            })
-        
-        return JsonResponse({'employees': employees_list})
-    return JsonResponse({'employees': []})
 
-def get_products_by_specialization(request):
+def get_options(request):
+    """Мастера для формы заказа по убыванию оценки подбора.
+
+    Товары и услуги форма фильтрует сама по снимку каталога (get_catalog_graph_snapshot),
+    с сервера нужен только порядок мастеров по категориям, товарам и адресу заказа.
+    Ответ помечается ETag по версиям каталога и мастеров, поэтому повторный запрос
+    с тем же выбором получает 304 без обращений к базе.
+    """
+    empty = {'employees': []}
     if not (request.user.is_authenticated and request.user.is_staff):
-        return JsonResponse({'products': []})
-        
-    # Поддерживаем как одиночный ID, так и массив ID
-    specialization_id = request.GET.get('specialization_id')
-    specialization_ids = request.GET.getlist('specialization_ids[]')
-    
-    if specialization_id:
-        specialization_ids = [specialization_id]
-    
-    if specialization_ids:
-        try:
-            specializations = Specialization.objects.filter(id__in=specialization_ids)
-            categories = Category.objects.filter(specialization__in=specializations).distinct()
-            products = Product.objects.filter(category__in=categories, available=True).values('id', 'name')
-            return JsonResponse({'products': list(products)})
-        except Exception:
-            pass
-    return JsonResponse({'products': []})
-
-def get_services_by_products(request):
+        return JsonResponse(empty)
+
+    try:
+        category_ids = _get_ids(request, 'category_ids')
+        product_ids = _get_ids(request, 'product_ids')
+    except ValueError:
+        return JsonResponse(empty)
+    if not category_ids:
+        return JsonResponse(empty)
+    city = request.GET.get('city', '')
+
+    version_parts = [get_catalog_graph_version(), get_masters_version(), category_ids, product_ids, city]
+    etag = quote_etag(hashlib.md5(repr(version_parts).encode()).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    response = JsonResponse({
+        'employees': [
+            {
+                'id': rec.employee_id,
+                'name': rec.name,
+                'score': rec.score,
+                'open_orders': rec.open_orders,
+                'city_match': rec.city_match,
+            }
+            # Тот же круг, что и в queryset поля формы заказа: только основной состав
+            for rec in master_index.recommend(category_ids, product_ids, city, k=None, statuses=('active',))
+        ],
+    })
+    response['ETag'] = etag
+    # Ответ зависит от пользователя, поэтому только кэш браузера и всегда с проверкой по ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+def get_catalog_graph_snapshot(request, version):
+    """Снимок связей каталога для зависимых списков: браузер фильтрует его сам, без запросов на каждый клик.
+
+    Адрес содержит версию, поэтому ответ кэшируется браузером надолго;
+    после изменения каталога страницы ссылаются уже на новый адрес.
+    """
     if not (request.user.is_authenticated and request.user.is_staff):
-        return JsonResponse({'services': []})
-        
-    product_ids = request.GET.getlist('product_ids[]')
-    if product_ids:
-        services = Service.objects.filter(product__in=product_ids, available=True).values('id', 'name')
-        return JsonResponse({'services': list(services)})
-    return JsonResponse({'services': []})
+        return JsonResponse({'specializations': [], 'categories': [], 'products': [], 'services': []})
 
-def get_products_by_categories(request):
-    if not (request.user.is_authenticated and request.user.is_staff):
-        return JsonResponse({'products': []})
-        
-    category_ids = request.GET.getlist('category_ids[]')
-    if category_ids:
-        products = Product.objects.filter(category__in=category_ids, available=True).values('id', 'name')
-        return JsonResponse({'products': list(products)})
-    return JsonResponse({'products': []})
+    current, payload = get_catalog_graph()
+    if version != current:
+        response = redirect('main:catalog_graph', version=current)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    etag = quote_etag(hashlib.md5(payload.encode()).hexdigest())
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is None:
+        response = HttpResponse(payload, content_type='application/json')
+    else:
+        response = not_modified
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
 
-def get_categories_by_specialization(request):
-    if not (request.user.is_authenticated and request.user.is_staff):
-        return JsonResponse({'categories': []})
-        
-    specialization_ids = request.GET.getlist('specialization_ids[]')
-    if specialization_ids:
-        try:
-            specializations = Specialization.objects.filter(id__in=specialization_ids)
-            categories = Category.objects.filter(specialization__in=specializations).distinct().values('id', 'name')
-            return JsonResponse({'categories': list(categories)})
-        except Exception:
-            pass
-    return JsonResponse({'categories': []})
-
-def get_employees_by_categories(request):
-    if not (request.user.is_authenticated and request.user.is_staff):
-        return JsonResponse({'employees': []})
-        
-    category_ids = request.GET.getlist('category_ids[]')
-    if category_ids:
-        # Получаем сотрудников по категориям (через специализацию и напрямую)
-        employees = Employee.objects.filter(
-            Q(specialization__categories__in=category_ids) |
-            Q(categories__in=category_ids),
-            available=True, 
-            status='active'
-        ).distinct().values('id', 'first_name', 'last_name')
-        
-        employees_list = []
-        for emp in employees:
-            employees_list.append({
-                'id': emp['id'],
-                'name': f"{emp['first_name']} {emp['last_name']}"
-            })
-        
-        return JsonResponse({'employees': employees_list})
-    return JsonResponse({'employees': []})
 
 class JobApplicationCreateFormView(CreateView):
     model = JobApplication
@@ -703,11 +1012,9 @@ class JobApplicationListView(StaffRequiredMixin, ListView):
         search = self.request.GET.get('search')
         if search:
             queryset = queryset.filter(
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search) |
-                Q(phone__icontains=search) |
-                Q(city__icontains=search) |
-                Q(specialization__icontains=search)
+                search_q(search, 'application') |
+                substring_q(search, 'first_name', 'last_name', 'city', 'specialization') |
+                phone_search_q(search)
             )
             
         return queryset
@@ -752,13 +1059,30 @@ class AllItemsListView(StaffRequiredMixin, TemplateView):
         services = Service.objects.select_related('product__category')
         
         if search:
-            categories = categories.filter(name__icontains=search)
-            products = products.filter(name__icontains=search)
-            services = services.filter(name__icontains=search)
+            categories = categories.filter(search_q(search, 'category') | substring_q(search, 'name'))
+            products = products.filter(search_q(search, 'product') | substring_q(search, 'name'))
+            services = services.filter(search_q(search, 'service') | substring_q(search, 'name'))
         
         context['categories'] = categories.order_by('name')
         context['products'] = products.order_by('name')
         context['services'] = services.order_by('name')
         context['search_query'] = search
         
-        return context
\ No newline at end of file
+        return context
+
+
+class SearchView(StaffRequiredMixin, ListView):
+    """Общий поиск по заказам, сотрудникам, анкетам и каталогу с ранжированием"""
+    template_name = "main/private/search.html"
+    context_object_name = "results"
+    paginate_by = 20
+
+    def get_queryset(self):
+        return SearchResults(self.request.GET.get('q', ''), self.request.GET.get('kind'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        context['kind'] = self.object_list.kind or ''
+        context['kind_choices'] = [(kind, model._meta.verbose_name_plural) for kind, model in KINDS.items()]
+        return context
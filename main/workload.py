@@ -0,0 +1,114 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Employee, Order
+
+
+# Статусы заказа, которые попадают в счетчики мастера
+# Открытая загрузка - подтвержденные заказы: новые и "перезвонить" мастер еще не принял
+OPEN_STATUSES = ("confirmed",)
+IN_PROGRESS_STATUSES = ("in_work",)
+RECENT_COMPLETED_DAYS = 30
+
+COUNTER_FIELDS = ("open_orders_count", "in_progress_orders_count", "completed_recent_count")
+
+# Связи заказ - мастер
+Assignments = Order.assigned_employees.through
+
+
+def counter_field(status, date_completed=None):
+    """Какой счетчик мастера учитывает заказ с таким статусом (None - никакой)"""
+    if status in OPEN_STATUSES:
+        return "open_orders_count"
+    if status in IN_PROGRESS_STATUSES:
+        return "in_progress_orders_count"
+    if status == "completed" and date_completed and date_completed >= timezone.now() - timedelta(days=RECENT_COMPLETED_DAYS):
+        return "completed_recent_count"
+    return None
+
+
+def update_counters(employee_ids, deltas):
+    """Одним UPDATE меняет счетчики мастеров на deltas = {поле: приращение}"""
+    changes = {field: Greatest(F(field) + n, 0) for field, n in deltas.items() if field and n}
+    employee_ids = list(employee_ids or [])
+    if changes and employee_ids:
+        Employee.objects.filter(pk__in=employee_ids).update(**changes)
+
+
+def orders_assigned(employee_ids, orders, sign=1):
+    """Мастерам назначены (sign=1) или сняты с них (sign=-1) заказы orders = [(статус, дата выполнения)]"""
+    deltas = Counter()
+    for status, date_completed in orders:
+        deltas[counter_field(status, date_completed)] += sign
+    update_counters(employee_ids, deltas)
+
+
+def status_changed(employee_ids, old, new):
+    """Заказ перешел из old = (статус, дата выполнения) в new - переносим его между счетчиками мастеров"""
+    old_field, new_field = counter_field(*old), counter_field(*new)
+    if old_field != new_field:
+        update_counters(employee_ids, {old_field: -1, new_field: 1})
+
+
+def orders_status_changed(orders, status, now):
+    """Заказам orders = [(id, статус, дата выполнения)] одним UPDATE задан статус status.
+
+    Переносит заказы между счетчиками их мастеров; мастера с одинаковыми
+    приращениями обновляются одним UPDATE. Возвращает id затронутых мастеров.
+    """
+    moves = {}
+    for order_id, old_status, old_completed in orders:
+        new_completed = (old_completed or now) if status == "completed" else None
+        old_field, new_field = counter_field(old_status, old_completed), counter_field(status, new_completed)
+        if old_field != new_field:
+            moves[order_id] = (old_field, new_field)
+    if not moves:
+        return set()
+
+    deltas = defaultdict(Counter)
+    for order_id, employee_id in Assignments.objects.filter(order_id__in=moves).values_list("order_id", "employee_id"):
+        old_field, new_field = moves[order_id]
+        deltas[employee_id][old_field] -= 1
+        deltas[employee_id][new_field] += 1
+
+    groups = defaultdict(list)
+    for employee_id, delta in deltas.items():
+        groups[frozenset((field, n) for field, n in delta.items() if field and n)].append(employee_id)
+    for delta, employee_ids in groups.items():
+        update_counters(employee_ids, dict(delta))
+    return set(deltas)
+
+
+def count_workload():
+    """Счетчики, посчитанные заново по заказам: {id мастера: {поле: значение}}"""
+    since = timezone.now() - timedelta(days=RECENT_COMPLETED_DAYS)
+    rows = (
+        Assignments.objects.values("employee_id")
+        .annotate(
+            open_orders_count=Count("order_id", filter=Q(order__status__in=OPEN_STATUSES)),
+            in_progress_orders_count=Count("order_id", filter=Q(order__status__in=IN_PROGRESS_STATUSES)),
+            completed_recent_count=Count("order_id", filter=Q(order__status="completed", order__date_completed__gte=since)),
+        )
+        .order_by()
+    )
+    return {row.pop("employee_id"): row for row in rows}
+
+
+def recount_workload(dry_run=False):
+    """Сверяет счетчики всех мастеров с заказами и исправляет их. Возвращает исправленных мастеров"""
+    expected = count_workload()
+    changed = []
+    for employee in Employee.objects.only("id", *COUNTER_FIELDS):
+        counts = expected.get(employee.pk, {})
+        values = {field: counts.get(field, 0) for field in COUNTER_FIELDS}
+        if any(getattr(employee, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(employee, field, value)
+            changed.append(employee)
+    if changed and not dry_run:
+        Employee.objects.bulk_update(changed, COUNTER_FIELDS, batch_size=500)
+    return changed
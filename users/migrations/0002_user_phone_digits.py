@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+def fill_phone_digits(apps, schema_editor):
+    for model_name in ['User']:
+        model = apps.get_model('users', model_name)
+        objects = list(model.objects.only('id', 'phone'))
+        for obj in objects:
+            obj.phone_digits = ''.join(ch for ch in str(obj.phone or '') if ch.isdigit())
+            obj.phone_digits_reversed = obj.phone_digits[::-1]
+        model.objects.bulk_update(objects, ['phone_digits', 'phone_digits_reversed'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, verbose_name='Телефон (цифры)'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_digits_reversed',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, verbose_name='Телефон (цифры в обратном порядке)'),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,8 @@ from django.db import models
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from main.models import PhoneDigitsModel
+
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, first_name, last_name, password=None, **extra_fields):
@@ -27,7 +29,7 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(email, first_name, last_name, password, **extra_fields)
 
 
-class User(AbstractUser):
+class User(AbstractUser, PhoneDigitsModel):
     email = models.EmailField(unique=True, verbose_name='Email')
     first_name = models.CharField(max_length=150, verbose_name='Имя', db_index=True)
     last_name = models.CharField(max_length=150,verbose_name='Фамилия', db_index=True)
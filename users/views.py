@@ -72,9 +72,9 @@ class UserOrdersView(LoginRequiredMixin, ListView):
     paginate_by = 10
     
     def get_queryset(self):
-        # Фильтруем заказы по номеру телефона пользователя, если он указан
-        if self.request.user.phone:
-            return Order.objects.filter(phone=self.request.user.phone).order_by('-date_created')
+        # Фильтруем заказы по номеру телефона пользователя (в виде цифр, по индексу), если он указан
+        if self.request.user.phone_digits:
+            return Order.objects.filter(phone_digits=self.request.user.phone_digits).order_by('-date_created')
         return Order.objects.none()
 
     